@@ -0,0 +1,102 @@
+import json
+import mmap
+import struct
+
+import pygame
+import pygame.image
+
+#
+# Baked image atlases.
+#
+# An atlas is one file holding any number of ready-made surfaces as raw pixel
+# data, so loading it costs no decoding, scaling or rotating at all.  It is a
+# fixed header, then the pixels of every surface back to back, then a JSON
+# index saying where each one is:
+#
+#   header  magic, version, index offset, index length
+#   pixels  RGB or RGBA rows, one surface after another
+#   index   [{"key": ..., "format": "RGBA", "size": [w, h], "offset": n, "color_key": [r, g, b] or null}, ...]
+#
+# Keys are whatever JSON the writer chose to identify its surfaces by.
+#
+# The loader maps the whole file into memory with one read-only mmap and wraps
+# each surface around its slice of it, so nothing is copied unless the surfaces
+# are converted to the display's pixel format.  Unconverted surfaces share the
+# mapping and must never be drawn on.
+#
+
+MAGIC = b'DKAT'
+VERSION = 1
+
+# magic, version, index offset, index length
+__header__ = struct.Struct('<4sHQI')
+
+def __pixel_format__(surface):
+	if surface.get_flags() & pygame.SRCALPHA:
+		return 'RGBA'
+	return 'RGB'
+
+# entries is a list of (key, surface).
+def write_atlas(path, entries):
+	index = []
+	with open(path, 'wb') as atlas_file:
+		atlas_file.write(bytes(__header__.size))
+		offset = __header__.size
+		for key, surface in entries:
+			pixel_format = __pixel_format__(surface)
+			pixels = pygame.image.tobytes(surface, pixel_format)
+			color_key = surface.get_colorkey()
+			index.append({
+				'key': key,
+				'format': pixel_format,
+				'size': list(surface.get_size()),
+				'offset': offset,
+				'color_key': None if color_key == None else list(color_key[:3]),
+			})
+			atlas_file.write(pixels)
+			offset += len(pixels)
+
+		index_bytes = json.dumps(index, separators=(',', ':')).encode('utf-8')
+		atlas_file.write(index_bytes)
+		atlas_file.seek(0)
+		atlas_file.write(__header__.pack(MAGIC, VERSION, offset, len(index_bytes)))
+
+class Atlas:
+	def __init__(self, mapping, entries):
+		# The surfaces point into the mapping, so it lives as long as the atlas does.
+		self.mapping = mapping
+		self.entries = entries
+
+	def __len__(self):
+		return len(self.entries)
+
+# Returns an Atlas whose entries are (key, surface).  With convert, and a display
+# to convert to, the surfaces are copied into the display's pixel format, which
+# is quicker to draw.
+def load_atlas(path, convert=True):
+	with open(path, 'rb') as atlas_file:
+		mapping = mmap.mmap(atlas_file.fileno(), 0, access=mmap.ACCESS_READ)
+	if len(mapping) < __header__.size:
+		raise ValueError(f"{path} is too short to be an atlas")
+	magic, version, index_offset, index_length = __header__.unpack_from(mapping)
+	if magic != MAGIC or version != VERSION:
+		raise ValueError(f"{path} is not a version {VERSION} atlas")
+	index = json.loads(mapping[index_offset:index_offset + index_length].decode('utf-8'))
+
+	convert = convert and not pygame.display.get_surface() is None
+	pixels = memoryview(mapping)
+	entries = []
+	for entry in index:
+		width, height = entry['size']
+		pixel_format = entry['format']
+		length = width * height * len(pixel_format)
+		surface = pygame.image.frombuffer(pixels[entry['offset']:entry['offset'] + length], (width, height), pixel_format)
+		if convert:
+			if pixel_format == 'RGBA':
+				surface = surface.convert_alpha()
+			else:
+				surface = surface.convert()
+		if entry['color_key'] != None:
+			surface.set_colorkey(entry['color_key'])
+		entries.append((entry['key'], surface))
+	return Atlas(mapping, entries)
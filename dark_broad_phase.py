@@ -0,0 +1,73 @@
+import math
+
+#
+# Broad-phase collision detection.
+#
+# A broad phase only narrows down which (target, projectile) pairs are worth an
+# exact test; it may report pairs that turn out not to touch, but never misses
+# a pair that does.  Targets and projectiles are sprites with a position and an
+# image.
+#
+
+# Every target against every projectile, which is what Arena always used to do.
+class BruteForceBroadPhase:
+	def candidate_pairs(self, targets, projectiles):
+		for target in targets:
+			for projectile in projectiles:
+				yield target, projectile
+
+# A uniform grid rebuilt on every call.  Targets (few and large) are hashed into
+# the cells they cover, then each projectile (many and small) looks up a single
+# cell, so the cost grows with the number of projectiles rather than targets
+# times projectiles, and no Rect is built for projectiles nowhere near a target.
+#
+# A projectile overlaps a target only if its top-left corner lies within
+# projectile_size of the target, so targets are padded by that much up and to
+# the left and projectiles are hashed by their top-left corner alone.  Anything
+# bigger than projectile_size falls back to testing all of the cells it covers.
+class SpatialHashBroadPhase:
+	def __init__(self, cell_size=64, projectile_size=16):
+		self.cell_size = cell_size
+		self.projectile_size = projectile_size
+
+	# Cells covered by the sprite, grown by a pixel either side since get_rect() rounds the position.
+	def __cell_range__(self, sprite, padding):
+		x, y = sprite.position
+		width, height = sprite.image.get_size()
+		return (
+			math.floor((x - padding - 1) / self.cell_size),
+			math.floor((y - padding - 1) / self.cell_size),
+			math.floor((x + width + 1) / self.cell_size),
+			math.floor((y + height + 1) / self.cell_size)
+		)
+
+	def candidate_pairs(self, targets, projectiles):
+		cell_size = self.cell_size
+		projectile_size = self.projectile_size
+
+		cells = {}
+		for target in targets:
+			left, top, right, bottom = self.__cell_range__(target, projectile_size)
+			for cell_x in range(left, right + 1):
+				for cell_y in range(top, bottom + 1):
+					cells.setdefault((cell_x, cell_y), []).append(target)
+
+		if len(cells) == 0:
+			return
+
+		for projectile in projectiles:
+			width, height = projectile.image.get_size()
+			if width <= projectile_size and height <= projectile_size:
+				# Float keys find the int keys above, since 3.0 == 3 and they hash alike.
+				x, y = projectile.position
+				for target in cells.get((x // cell_size, y // cell_size), ()):
+					yield target, projectile
+			else:
+				seen = []
+				left, top, right, bottom = self.__cell_range__(projectile, 0)
+				for cell_x in range(left, right + 1):
+					for cell_y in range(top, bottom + 1):
+						for target in cells.get((cell_x, cell_y), ()):
+							if not target in seen:
+								seen.append(target)
+								yield target, projectile
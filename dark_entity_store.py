@@ -0,0 +1,139 @@
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+def is_available():
+	return not numpy is None
+
+#
+# Struct-of-arrays storage for moving objects.
+#
+# Every attached object owns one row ("slot") in a set of contiguous arrays, so
+# gravity, movement and ageing run as a handful of NumPy operations over all of
+# them at once.  Rows are kept densely packed: detaching an object moves the last
+# row into the hole, so every batch operation works on plain slices.
+#
+# Objects read and write their state through the store while attached, and get
+# a copy of it back when they are detached.
+#
+class EntityStore:
+	def __init__(self, capacity=64):
+		self.count = 0
+		self.capacity = 0
+		self.owners = []
+		self.position = numpy.zeros((0, 2))
+		self.previous_position = numpy.zeros((0, 2))
+		self.velocity = numpy.zeros((0, 2))
+		self.direction = numpy.zeros(0)
+		self.lifetime = numpy.zeros(0, dtype=numpy.int64)
+		self.ageing = numpy.zeros(0, dtype=bool)
+		self.half_size = numpy.zeros((0, 2))
+		self.__grow__(capacity)
+
+	def __grow__(self, capacity):
+		def resized(array):
+			grown = numpy.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+			grown[:self.count] = array[:self.count]
+			return grown
+
+		self.position = resized(self.position)
+		self.previous_position = resized(self.previous_position)
+		self.velocity = resized(self.velocity)
+		self.direction = resized(self.direction)
+		self.lifetime = resized(self.lifetime)
+		self.ageing = resized(self.ageing)
+		self.half_size = resized(self.half_size)
+		self.owners.extend([None] * (capacity - self.capacity))
+		self.capacity = capacity
+
+	def __len__(self):
+		return self.count
+
+	# size is the object's image size, used to find its centre the same way get_rect() does.
+	# Objects with a lifetime have it increased by one every step.
+	def attach(self, owner, position, velocity, direction, size, lifetime=None, previous_position=None):
+		if self.count == self.capacity:
+			self.__grow__(self.capacity * 2)
+		slot = self.count
+		self.count += 1
+
+		self.position[slot] = position
+		self.previous_position[slot] = position if previous_position == None else previous_position
+		self.velocity[slot] = velocity
+		self.direction[slot] = direction
+		self.lifetime[slot] = 0 if lifetime == None else lifetime
+		self.ageing[slot] = not lifetime == None
+		# Matches pygame.Rect.center, which uses integer division.
+		self.half_size[slot] = (size[0] // 2, size[1] // 2)
+		self.owners[slot] = owner
+		return slot
+
+	def detach(self, slot):
+		last = self.count - 1
+		if slot != last:
+			for array in [self.position, self.previous_position, self.velocity, self.direction, self.lifetime, self.ageing, self.half_size]:
+				array[slot] = array[last]
+			moved = self.owners[last]
+			self.owners[slot] = moved
+			moved.entity_slot = slot
+		self.owners[last] = None
+		self.count = last
+
+	def get_position(self, slot):
+		return tuple(self.position[slot].tolist())
+
+	def get_previous_position(self, slot):
+		return tuple(self.previous_position[slot].tolist())
+
+	def get_velocity(self, slot):
+		return tuple(self.velocity[slot].tolist())
+
+	def get_direction(self, slot):
+		return self.direction[slot].item()
+
+	# Positions interpolation of the way from previous_position to position, for the given slots.
+	def interpolated_positions(self, slots, interpolation=1):
+		if interpolation == 1:
+			return self.position[slots].tolist()
+		previous_position = self.previous_position[slots]
+		return (previous_position + (self.position[slots] - previous_position) * interpolation).tolist()
+
+	def get_lifetime(self, slot):
+		return self.lifetime[slot].item()
+
+	# Centres of every object, rounded like pygame.Rect rounds float coordinates (half away from zero).
+	def centers(self):
+		position = self.position[:self.count]
+		return numpy.copysign(numpy.floor(numpy.abs(position) + 0.5), position) + self.half_size[:self.count]
+
+	# Constant-magnitude pull towards center, for every object at once.
+	# Objects sitting exactly on the centre are left alone.
+	def apply_gravity(self, center, strength):
+		offset = numpy.asarray(center, dtype=float) - self.centers()
+		length = numpy.sqrt(offset[:, 0] * offset[:, 0] + offset[:, 1] * offset[:, 1])
+		pulled = length > 0
+		offset[pulled] /= length[pulled, None]
+		offset[~pulled] = 0
+		self.velocity[:self.count] += offset * strength
+
+	def move(self):
+		self.previous_position[:self.count] = self.position[:self.count]
+		self.position[:self.count] += self.velocity[:self.count]
+		self.lifetime[:self.count] += self.ageing[:self.count]
+
+	# Like move(), with a dark_integrator.Integrator doing the moving, and the gravity too.
+	# thrusting are the attached objects that accelerate themselves, by their thrust().
+	def integrate(self, integrator, pull, body_centers, thrusting=()):
+		count = self.count
+		self.previous_position[:count] = self.position[:count]
+		thrust = numpy.zeros((count, 2))
+		for owner in thrusting:
+			thrust[owner.entity_slot] = owner.thrust()
+		integrator.advance(self.position[:count], self.velocity[:count], self.half_size[:count], pull, body_centers, thrust)
+		self.lifetime[:count] += self.ageing[:count]
+
+	# Owners whose lifetime has passed maximum_lifetime.
+	def expired(self, maximum_lifetime):
+		slots = numpy.flatnonzero(self.lifetime[:self.count] > maximum_lifetime)
+		return [self.owners[slot] for slot in slots.tolist()]
@@ -0,0 +1,158 @@
+import math
+
+from dark_math import *
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+def is_available():
+	return not numpy is None
+
+#
+# Gravity engines.
+#
+# Every body pulls every moving object towards its centre with a constant
+# strength, whatever the distance.  Bodies are (center, strength) pairs and
+# objects are sprites with a position, a velocity and an image, whose centre is
+# worked out the same way get_rect() does it.  Something sitting exactly on a
+# body's centre has no direction to fall in, so that body leaves it alone.
+#
+# An engine pulls a list of objects (apply) or everything in a
+# dark_entity_store.EntityStore (apply_to_store).
+#
+
+# One object and one body at a time, which is what Arena always used to do.
+class ObjectGravity:
+	name = 'objects'
+
+	def apply(self, bodies, objects):
+		for space_object in objects:
+			center = space_object.get_rect().center
+			for body_center, strength in bodies:
+				offset = sub2(body_center, center)
+				if are_equal2(offset, (0,0)):
+					continue
+				space_object.accelerate(mul2(normal2(offset), strength))
+
+	def apply_to_store(self, bodies, entity_store):
+		for center, strength in bodies:
+			entity_store.apply_gravity(center, strength)
+
+	# For dark_integrator, which needs the pull at arbitrary points.
+	def accelerations(self, centers, bodies):
+		return exact_accelerations(centers, bodies)
+
+# The pull of every body on every object, as an array of shape (objects, 2).
+# The pulls are summed in body order, so a single body gives exactly what
+# ObjectGravity does.
+def exact_accelerations(centers, bodies):
+	body_centers = numpy.array([center for center, strength in bodies], dtype=float)
+	strengths = numpy.array([strength for center, strength in bodies], dtype=float)
+
+	offset = body_centers[None, :, :] - centers[:, None, :]
+	length = numpy.sqrt(offset[:, :, 0] * offset[:, :, 0] + offset[:, :, 1] * offset[:, :, 1])[:, :, None]
+	direction = numpy.divide(offset, length, out=numpy.zeros_like(offset), where=length > 0)
+	direction *= strengths[None, :, None]
+	if len(bodies) == 1:
+		return direction[:, 0]
+	return direction.sum(axis=1)
+
+# Base for the NumPy engines, which only have to provide accelerations(centers, bodies).
+class BatchedGravity:
+	def apply(self, bodies, objects):
+		objects = list(objects)
+		if len(objects) == 0 or len(bodies) == 0:
+			return
+		position = numpy.array([space_object.position for space_object in objects], dtype=float)
+		half_size = numpy.array([space_object.image.get_size() for space_object in objects]) // 2
+		# Rect rounds halves away from zero.
+		centers = numpy.copysign(numpy.floor(numpy.abs(position) + 0.5), position) + half_size
+
+		velocity = numpy.array([space_object.velocity for space_object in objects], dtype=float)
+		velocity += self.accelerations(centers, bodies)
+		for space_object, object_velocity in zip(objects, velocity.tolist()):
+			space_object.velocity = tuple(object_velocity)
+
+	def apply_to_store(self, bodies, entity_store):
+		if entity_store.count == 0 or len(bodies) == 0:
+			return
+		entity_store.velocity[:entity_store.count] += self.accelerations(entity_store.centers(), bodies)
+
+# Every object against every body in one NumPy pass.
+class ExactGravity(BatchedGravity):
+	name = 'exact'
+
+	def accelerations(self, centers, bodies):
+		return exact_accelerations(centers, bodies)
+
+#
+# The summed pull of static bodies, worked out once at the corners of a grid of
+# cell_size pixel cells covering size, then looked up with bilinear
+# interpolation.  The lookup costs the same however many bodies there are, but
+# is only an approximation, and a poor one within a cell or so of a body's
+# centre - where objects have usually hit the body already.
+#
+# Objects outside the grid get the exact pull instead.  The grid is rebuilt
+# whenever the bodies change, so moving bodies work but gain nothing.
+#
+class FieldGravity(BatchedGravity):
+	name = 'field'
+
+	def __init__(self, size, cell_size=8):
+		self.size = size
+		self.cell_size = cell_size
+		self.columns = math.ceil(size[0] / cell_size) + 1
+		self.rows = math.ceil(size[1] / cell_size) + 1
+		self.bodies = None
+		self.field = None
+
+	def __build__(self, bodies):
+		x = numpy.arange(self.columns, dtype=float) * self.cell_size
+		y = numpy.arange(self.rows, dtype=float) * self.cell_size
+		corners = numpy.stack(numpy.meshgrid(x, y, indexing='ij'), axis=-1).reshape(-1, 2)
+		# Corner (column, row) is row column * rows + row.
+		self.field = exact_accelerations(corners, bodies)
+		self.bodies = list(bodies)
+
+	def accelerations(self, centers, bodies):
+		if self.bodies != bodies:
+			self.__build__(bodies)
+
+		grid = centers / self.cell_size
+		cell = numpy.floor(grid)
+		fraction = grid - cell
+		fx, fy = fraction[:, 0, None], fraction[:, 1, None]
+		column = numpy.clip(cell[:, 0], 0, self.columns - 2).astype(numpy.intp)
+		row = numpy.clip(cell[:, 1], 0, self.rows - 2).astype(numpy.intp)
+		corner = column * self.rows + row
+
+		field = self.field
+		accelerations = (
+			field.take(corner, axis=0) * ((1 - fx) * (1 - fy))
+			+ field.take(corner + self.rows, axis=0) * (fx * (1 - fy))
+			+ field.take(corner + 1, axis=0) * ((1 - fx) * fy)
+			+ field.take(corner + self.rows + 1, axis=0) * (fx * fy)
+		)
+
+		# Clipping looked up the nearest cell for anything outside the grid, so put those right.
+		outside = (cell[:, 0] != column) | (cell[:, 1] != row)
+		if outside.any():
+			accelerations[outside] = exact_accelerations(centers[outside], bodies)
+		return accelerations
+
+engine_names = ['objects', 'exact', 'field']
+
+# Builds an engine by name, for an arena of the given size.
+def create_engine(name, size):
+	if name != 'objects' and not is_available():
+		print("NumPy is not installed, falling back to per-object gravity.")
+		name = 'objects'
+	if name == 'objects':
+		return ObjectGravity()
+	if name == 'exact':
+		return ExactGravity()
+	if name == 'field':
+		return FieldGravity(size)
+	raise ValueError(f"Unknown gravity engine {name}")
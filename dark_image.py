@@ -1,5 +1,6 @@
 from pickle import NONE
 import pygame.image
+import pygame.mask
 import pygame.transform
 
 from dark_math import *
@@ -8,20 +9,47 @@ from dark_math import *
 # In reality, this color just doesn't get blitted.
 __color_key__ = None
 
+# Every image loaded from storage is kept here for the life of the process, keyed
+# by everything that affects the final surface.  Callers must treat the returned
+# surfaces as read-only since they are shared.
+__image_cache__ = {}
+
 def set_color_key(color):
 	global __color_key__
 	__color_key__ = color
 
+def __image_cache_key__(path, size, color_key):
+	if not size == None:
+		size = tuple(size)
+	if not color_key is None:
+		color_key = tuple(color_key)
+	return (path, size, color_key)
+
 def load_image(path, size=None):
 	global __color_key__
-	print(f"Loading image asset from storage {path} scaled to surface {size}")
-	image = pygame.image.load(path).convert_alpha()
-	if not size == None:
-		image = pygame.transform.scale(image, size)
-	if not __color_key__ is None:
-		image.set_colorkey(__color_key__)
+	key = __image_cache_key__(path, size, __color_key__)
+	image = __image_cache__.get(key)
+	if image is None:
+		print(f"Loading image asset from storage {path} scaled to surface {size}")
+		image = pygame.image.load(path)
+		# Headless runs may have no display at all, and so no pixel format to convert to.
+		if not pygame.display.get_surface() is None:
+			image = image.convert_alpha()
+		if not size == None:
+			image = pygame.transform.scale(image, size)
+		if not __color_key__ is None:
+			image.set_colorkey(__color_key__)
+		__image_cache__[key] = image
 	return image
 
+# Every cached image as ((path, size, color_key), image), for baking into an atlas.
+def cached_images():
+	return list(__image_cache__.items())
+
+# Caches a ready-made image, as if load_image(path, size) had loaded it with color_key set.
+def cache_image(path, size, color_key, image):
+	__image_cache__[__image_cache_key__(path, size, color_key)] = image
+
 def rotate_image_circular(image, direction_degrees):
 	rotated = pygame.transform.rotate(image, direction_degrees)
 	offset = div2((rotated.get_rect().width - image.get_rect().width, rotated.get_rect().height - image.get_rect().height),2)
@@ -30,3 +58,13 @@ def rotate_image_circular(image, direction_degrees):
 	result.blit(rotated, mul2(offset, -1))
 	return result
 
+# The pixels of image that actually get drawn.  With a color key those are the
+# pixels that differ from it, which also works for opaque surfaces such as the
+# ones rotate_image_circular produces.
+def mask_from_image(image, color_key=None):
+	if color_key is None:
+		return pygame.mask.from_surface(image)
+	mask = pygame.mask.from_threshold(image, color_key, (1,1,1,255))
+	mask.invert()
+	return mask
+
@@ -0,0 +1,116 @@
+import struct
+
+#
+# Per-tick binary input logs.
+#
+# A log is a fixed header followed by one byte per player per tick, in tick
+# order.  Each byte packs one player's controls for that tick:
+#
+#   bits 0-1  rotate: 0 none, 1 clockwise (+1), 2 anticlockwise (-1)
+#   bit  2    thrusters
+#   bit  3    fire
+#
+# The header records what a replay needs to set the game up the same way
+# (tick rate, resolution and game specific flags), how many ticks were
+# recorded, and a digest of the game state after the last tick, so a replay
+# can tell whether it came out bit-identical.  The tick count and digest are
+# only filled in by close(); a log that was never closed reads as empty.
+#
+
+MAGIC = b'DKIN'
+VERSION = 2
+
+# magic, version, players, flags, ticks per second, width, height, tick count, digest
+__header__ = struct.Struct('<4sHBIHHHI32s')
+# Version 1 logs only had room for eight flags.
+__header_version_1__ = struct.Struct('<4sHBBHHHI32s')
+__preamble__ = struct.Struct('<4sH')
+
+def pack_input(rotate, thrusters, fire):
+	value = 0
+	if rotate > 0:
+		value = 1
+	elif rotate < 0:
+		value = 2
+	if thrusters:
+		value |= 4
+	if fire:
+		value |= 8
+	return value
+
+def unpack_input(value):
+	rotate = 0
+	if value & 3 == 1:
+		rotate = +1
+	elif value & 3 == 2:
+		rotate = -1
+	return rotate, value & 4 != 0, value & 8 != 0
+
+class InputRecorder:
+	def __init__(self, path, players=2, ticks_per_second=60, resolution=(0,0), flags=0):
+		self.path = path
+		self.players = players
+		self.ticks_per_second = ticks_per_second
+		self.resolution = resolution
+		self.flags = flags
+		self.tick_count = 0
+		self.file = open(path, 'wb')
+		self.__write_header__(b'')
+
+	def __write_header__(self, digest):
+		width, height = self.resolution
+		self.file.write(__header__.pack(
+			MAGIC, VERSION, self.players, self.flags, self.ticks_per_second,
+			width, height, self.tick_count, digest
+		))
+
+	# One packed input per player, for the tick about to run.
+	def record(self, *inputs):
+		self.file.write(bytes(inputs))
+		self.tick_count += 1
+
+	def close(self, digest=b''):
+		if self.file == None:
+			return
+		self.file.seek(0)
+		self.__write_header__(digest)
+		self.file.close()
+		self.file = None
+
+class InputLog:
+	def __init__(self, players, ticks_per_second, resolution, flags, tick_count, digest, data):
+		self.players = players
+		self.ticks_per_second = ticks_per_second
+		self.resolution = resolution
+		self.flags = flags
+		self.tick_count = tick_count
+		self.digest = digest
+		self.data = data
+
+	def __len__(self):
+		return self.tick_count
+
+	# The packed input of every player for one tick.
+	def inputs(self, tick):
+		start = tick * self.players
+		return tuple(self.data[start:start + self.players])
+
+def load_input_log(path):
+	with open(path, 'rb') as log_file:
+		data = log_file.read()
+	if len(data) < __preamble__.size:
+		raise ValueError(f"{path} is too short to be an input log")
+	magic, version = __preamble__.unpack_from(data)
+	header = {1: __header_version_1__, VERSION: __header__}.get(version)
+	if magic != MAGIC or header == None:
+		raise ValueError(f"{path} is not a version 1 or {VERSION} input log")
+	if len(data) < header.size:
+		raise ValueError(f"{path} is too short to be an input log")
+	magic, version, players, flags, ticks_per_second, width, height, tick_count, digest = header.unpack_from(data)
+	body = data[header.size:header.size + tick_count * players]
+	if len(body) != tick_count * players:
+		raise ValueError(f"{path} is truncated: expected {tick_count} ticks")
+	# An all zero digest means none was recorded.
+	if digest == bytes(len(digest)):
+		digest = b''
+	return InputLog(players, ticks_per_second, (width, height), flags, tick_count, digest, body)
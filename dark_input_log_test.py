@@ -0,0 +1,61 @@
+import contextlib
+import io
+import os
+import tempfile
+
+import space_war
+import space_war_headless
+import space_war_replay
+import dark_input_log
+import dark_integrator
+
+#
+# Input logs replay bit-identically: a round is recorded with
+# space_war.start_recording, loaded back and replayed with space_war_replay,
+# and the replay has to end on the digest stored in the log.  Runs headless,
+# with python dark_input_log_test.py or under pytest.
+#
+
+def record_and_replay(seed, moons=0, integrator='euler', substeps=1):
+	screen = space_war_headless.init_headless((1920,1080), False)
+	with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+		space_war.preload_assets()
+		path = os.path.join(directory, 'round.dkin')
+
+		arena = space_war.Arena(screen, integrator=dark_integrator.create_integrator(integrator, substeps))
+		arena.add_moons(moons)
+		recorder = space_war.start_recording(path, arena, 60)
+		alliance_pilot = space_war_headless.RandomPilot(seed)
+		federation_pilot = space_war_headless.AimingPilot(seed=seed + 1)
+		tick_count = 0
+		while arena.is_alive() and tick_count < 600:
+			alliance_controls = alliance_pilot.controls(arena, arena.fighter_alliance, arena.fighter_federation)
+			federation_controls = federation_pilot.controls(arena, arena.fighter_federation, arena.fighter_alliance)
+			recorder.record(space_war.controls_to_byte(alliance_controls), space_war.controls_to_byte(federation_controls))
+			arena.apply_controls(alliance_controls, federation_controls)
+			arena.tick()
+			tick_count += 1
+		recorder.close(arena.state_digest())
+
+		log = dark_input_log.load_input_log(path)
+		assert len(log) == tick_count
+		assert log.digest != b'', "no digest was recorded"
+		replayed_arena, replayed_tick_count = space_war_replay.replay_round(screen, log)
+	assert replayed_tick_count == tick_count
+	assert replayed_arena.state_digest() == log.digest, f"replay diverged (seed {seed}, moons {moons}, integrator {integrator})"
+
+# Test 1: plain rounds
+def test_replay():
+	for seed in [0, 10, 20]:
+		record_and_replay(seed)
+
+# Test 2: the settings kept in the log's flags are restored for the replay
+def test_replay_settings():
+	if not dark_integrator.is_available():
+		return
+	record_and_replay(30, moons=2, integrator='verlet', substeps=4)
+
+if __name__ == '__main__':
+	test_replay()
+	test_replay_settings()
+	print("Recorded rounds replay bit-identically.")
@@ -0,0 +1,131 @@
+import collections
+import threading
+
+import dark_profile
+
+#
+# Input latency.
+#
+# Every input event is stamped with the time it was handled.  When a simulation
+# step takes the controls, the oldest event each player sent since the step
+# before is the one that step answers, and once a frame showing that step has
+# been presented, the time since that event goes into the player's histogram.
+#
+# That is input to present: whatever time the display then takes to light up
+# the frame cannot be seen from here.
+#
+# Steps are applied on whichever thread simulates and presented on the one that
+# draws, hence the lock.
+#
+
+class LatencyHistogram:
+	def __init__(self, bucket_seconds=0.001, bucket_count=250):
+		self.bucket_seconds = bucket_seconds
+		# The last bucket holds everything slower than the rest.
+		self.buckets = [0] * (bucket_count + 1)
+		self.count = 0
+		self.total_seconds = 0
+		self.maximum_seconds = 0
+
+	def add(self, seconds):
+		bucket = min(int(seconds / self.bucket_seconds), len(self.buckets) - 1)
+		self.buckets[bucket] += 1
+		self.count += 1
+		self.total_seconds += seconds
+		self.maximum_seconds = max(self.maximum_seconds, seconds)
+
+	def mean(self):
+		if self.count == 0:
+			return 0
+		return self.total_seconds / self.count
+
+	# The upper edge of the bucket holding the nearest rank sample, see dark_profile.percentile_rank().
+	def percentile(self, fraction):
+		if self.count == 0:
+			return 0
+		rank = dark_profile.percentile_rank(self.count, fraction)
+		seen = 0
+		for bucket, count in enumerate(self.buckets):
+			seen += count
+			if seen >= rank:
+				break
+		if bucket == len(self.buckets) - 1:
+			return self.maximum_seconds
+		return min((bucket + 1) * self.bucket_seconds, self.maximum_seconds)
+
+	def summary(self):
+		return (
+			f"{self.count} inputs, mean {self.mean() * 1000:.1f}ms, "
+			f"p50 {self.percentile(0.5) * 1000:.1f}ms, p95 {self.percentile(0.95) * 1000:.1f}ms, "
+			f"p99 {self.percentile(0.99) * 1000:.1f}ms, max {self.maximum_seconds * 1000:.1f}ms"
+		)
+
+	# Text bars from the first bucket with anything in it to the last, merging
+	# neighbouring buckets so there are at most maximum_lines bars.
+	def bar_lines(self, width=40, maximum_lines=20):
+		used = [bucket for bucket, count in enumerate(self.buckets) if count > 0]
+		if len(used) == 0:
+			return []
+		first, last = used[0], used[-1]
+		merged = max(1, -(-(last - first + 1) // maximum_lines))
+		bars = []
+		for bucket in range(first, last + 1, merged):
+			buckets = self.buckets[bucket:min(bucket + merged, last + 1)]
+			low = bucket * self.bucket_seconds * 1000
+			if bucket + len(buckets) >= len(self.buckets):
+				label = f"{low:.0f}ms+"
+			else:
+				label = f"{low:.0f}-{low + len(buckets) * self.bucket_seconds * 1000:.0f}ms"
+			bars.append((label, sum(buckets)))
+
+		most = max(count for label, count in bars)
+		lines = []
+		for label, count in bars:
+			# Anything at all gets at least one mark.
+			length = max(min(count, 1), round(count * width / most))
+			lines.append(f"{label:>11} {'#' * length:<{width}} {count}")
+		return lines
+
+	def to_dict(self):
+		return {
+			'bucket_ms': self.bucket_seconds * 1000,
+			'buckets': list(self.buckets),
+			'count': self.count,
+			'mean_ms': self.mean() * 1000,
+			'p50_ms': self.percentile(0.5) * 1000,
+			'p95_ms': self.percentile(0.95) * 1000,
+			'p99_ms': self.percentile(0.99) * 1000,
+			'max_ms': self.maximum_seconds * 1000,
+		}
+
+class InputLatency:
+	def __init__(self, player_names, bucket_seconds=0.001, bucket_count=250):
+		self.lock = threading.Lock()
+		self.player_names = player_names
+		self.histograms = [LatencyHistogram(bucket_seconds, bucket_count) for name in player_names]
+		# (step, player, event time) for every answered event not presented yet, oldest step first.
+		self.in_flight = collections.deque()
+
+	# Step number step has answered player's event from event_time.
+	def applied(self, step, player, event_time):
+		with self.lock:
+			self.in_flight.append((step, player, event_time))
+
+	# A frame showing every step up to and including step was presented at present_time.
+	def presented(self, step, present_time):
+		with self.lock:
+			while len(self.in_flight) > 0 and self.in_flight[0][0] <= step:
+				applied_step, player, event_time = self.in_flight.popleft()
+				self.histograms[player].add(present_time - event_time)
+
+	def report_lines(self):
+		lines = []
+		with self.lock:
+			for name, histogram in zip(self.player_names, self.histograms):
+				lines.append(f"{name} input to present latency: {histogram.summary()}")
+				lines += ['  ' + line for line in histogram.bar_lines()]
+		return lines
+
+	def to_dict(self):
+		with self.lock:
+			return {name: histogram.to_dict() for name, histogram in zip(self.player_names, self.histograms)}
@@ -0,0 +1,91 @@
+import heapq
+import random
+import socket
+import time
+
+#
+# Datagram links.
+#
+# A link sends and receives whole datagrams without ever blocking, and keeps no
+# promises: anything sent may be lost, duplicated or arrive out of order, so the
+# protocol on top has to cope with that itself.
+#
+
+def resolve_address(host, port):
+	return socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_DGRAM)[0][4]
+
+# A non-blocking UDP socket talking to one peer.
+class UdpEndpoint:
+	def __init__(self, local_address, remote_address, maximum_datagram_size=2048):
+		self.remote_address = resolve_address(*remote_address)
+		self.maximum_datagram_size = maximum_datagram_size
+		self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.socket.bind(local_address)
+		self.socket.setblocking(False)
+
+	def send(self, datagram):
+		try:
+			self.socket.sendto(datagram, self.remote_address)
+		except OSError:
+			# Nobody listening yet (an ICMP "port unreachable" from an earlier send), or a full buffer.
+			pass
+
+	# Every datagram that has arrived from the peer since the last call.
+	def receive(self):
+		datagrams = []
+		while True:
+			try:
+				datagram, address = self.socket.recvfrom(self.maximum_datagram_size)
+			except (BlockingIOError, InterruptedError):
+				break
+			except ConnectionResetError:
+				# Windows reports an earlier send to a closed port here.
+				continue
+			if address == self.remote_address:
+				datagrams.append(datagram)
+		return datagrams
+
+	def close(self):
+		self.socket.close()
+
+#
+# Makes a link worse on purpose: outgoing datagrams are dropped with probability
+# loss and held back for delay seconds plus up to jitter seconds more, which
+# also reorders them.  Only what this side sends is affected, so run both sides
+# through one to spoil both directions.
+#
+class SimulatedLink:
+	def __init__(self, link, loss=0, delay=0, jitter=0, seed=None, clock=time.perf_counter):
+		self.link = link
+		self.loss = loss
+		self.delay = delay
+		self.jitter = jitter
+		self.random = random.Random(seed)
+		self.clock = clock
+		self.queue = []
+		self.sequence = 0
+		self.sent = 0
+		self.dropped = 0
+
+	def __flush__(self):
+		now = self.clock()
+		while len(self.queue) > 0 and self.queue[0][0] <= now:
+			due_time, sequence, datagram = heapq.heappop(self.queue)
+			self.link.send(datagram)
+
+	def send(self, datagram):
+		self.sent += 1
+		if self.random.random() < self.loss:
+			self.dropped += 1
+		else:
+			due_time = self.clock() + self.delay + self.random.uniform(0, self.jitter)
+			heapq.heappush(self.queue, (due_time, self.sequence, datagram))
+			self.sequence += 1
+		self.__flush__()
+
+	def receive(self):
+		self.__flush__()
+		return self.link.receive()
+
+	def close(self):
+		self.link.close()
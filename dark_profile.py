@@ -0,0 +1,197 @@
+import collections
+import csv
+import gc
+import json
+import math
+import sys
+import time
+
+#
+# Per-frame profiling.
+#
+# Code wraps each phase of a frame in "with profiler.measure('phase'):".  Time
+# spent in a phase is summed over the frame (a phase can run several times per
+# frame, like the simulation when it catches up), and end_frame() files the
+# totals into a rolling window for averages and percentiles, and into a trace
+# that can be written out as CSV or JSON.
+#
+# Allocations are counted as the net change in allocated memory blocks over the
+# frame, plus the number of garbage collector runs it triggered.
+#
+
+class __NullMeasurement__:
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exception_type, exception, traceback):
+		return False
+
+__null_measurement__ = __NullMeasurement__()
+
+# Stands in when profiling is off, so instrumented code needs no checks.
+class NullProfiler:
+	enabled = False
+
+	def measure(self, phase):
+		return __null_measurement__
+
+	def count(self, name, value):
+		pass
+
+	def begin_frame(self):
+		pass
+
+	def end_frame(self):
+		pass
+
+class Measurement:
+	def __init__(self, profiler, phase):
+		self.profiler = profiler
+		self.phase = phase
+		self.start_time = 0
+
+	def __enter__(self):
+		self.start_time = self.profiler.clock()
+		return self
+
+	def __exit__(self, exception_type, exception, traceback):
+		self.profiler.add(self.phase, self.profiler.clock() - self.start_time)
+		return False
+
+def __gc_collections__():
+	return sum(generation['collections'] for generation in gc.get_stats())
+
+# Percentiles are nearest rank everywhere they are reported (the overlay, the
+# benchmark results and the latency histograms), so they all agree: the 1-based
+# rank among count sorted samples of the one fraction of the way through them.
+# The tolerance stops float error such as 0.07 * 100 == 7.000000000000001 from
+# bumping the rank up by one.
+def percentile_rank(count, fraction):
+	return min(count, max(1, math.ceil(fraction * count - 1e-9)))
+
+def percentile(sorted_values, fraction):
+	if len(sorted_values) == 0:
+		return 0
+	return sorted_values[percentile_rank(len(sorted_values), fraction) - 1]
+
+class FrameProfiler:
+	enabled = True
+
+	def __init__(self, window=300, trace_limit=100000, clock=time.perf_counter):
+		self.window = window
+		self.clock = clock
+		self.history = {}
+		self.measurements = {}
+		self.trace = collections.deque(maxlen=trace_limit)
+		self.frame_index = 0
+		self.frame_phases = {}
+		self.frame_counters = {}
+		self.frame_start_time = None
+		self.frame_start_blocks = 0
+		self.frame_start_collections = 0
+
+	# Measurements are reused, so a phase can't be nested inside itself.
+	def measure(self, phase):
+		measurement = self.measurements.get(phase)
+		if measurement is None:
+			measurement = Measurement(self, phase)
+			self.measurements[phase] = measurement
+		return measurement
+
+	def add(self, phase, seconds):
+		self.frame_phases[phase] = self.frame_phases.get(phase, 0) + seconds
+
+	def count(self, name, value):
+		self.frame_counters[name] = value
+
+	def begin_frame(self):
+		self.frame_phases = {}
+		self.frame_counters = {}
+		self.frame_start_blocks = sys.getallocatedblocks()
+		self.frame_start_collections = __gc_collections__()
+		self.frame_start_time = self.clock()
+
+	def end_frame(self):
+		if self.frame_start_time == None:
+			return
+		self.frame_phases['frame'] = self.clock() - self.frame_start_time
+		self.frame_counters['allocated_blocks'] = sys.getallocatedblocks() - self.frame_start_blocks
+		self.frame_counters['gc_collections'] = __gc_collections__() - self.frame_start_collections
+
+		# Phases that didn't run this frame still count, as zero, towards their averages.
+		for phase in self.history:
+			if not phase in self.frame_phases:
+				self.frame_phases[phase] = 0
+		for phase, seconds in self.frame_phases.items():
+			history = self.history.get(phase)
+			if history is None:
+				history = collections.deque(maxlen=self.window)
+				self.history[phase] = history
+			history.append(seconds)
+
+		row = {'frame': self.frame_index, 'time': self.frame_start_time}
+		for phase, seconds in self.frame_phases.items():
+			row[phase + '_ms'] = seconds * 1000
+		row.update(self.frame_counters)
+		self.trace.append(row)
+
+		self.frame_index += 1
+		self.frame_start_time = None
+
+	# Rolling (mean, p99) in milliseconds for every phase.
+	def statistics(self):
+		statistics = {}
+		for phase, history in self.history.items():
+			values = sorted(history)
+			statistics[phase] = (sum(values) / len(values) * 1000, percentile(values, 0.99) * 1000)
+		return statistics
+
+	def overlay_lines(self):
+		lines = [f"{'phase':<10} {'avg ms':>7} {'p99 ms':>7}"]
+		for phase, (mean, p99) in self.statistics().items():
+			lines.append(f"{phase:<10} {mean:7.2f} {p99:7.2f}")
+		if len(self.trace) > 0:
+			for name, value in self.trace[-1].items():
+				if not name in ['frame', 'time'] and not name.endswith('_ms'):
+					lines.append(f"{name} {value}")
+		return lines
+
+	# Writes every traced frame, as JSON if the path ends in .json and CSV otherwise.
+	def dump(self, path):
+		rows = list(self.trace)
+		if path.endswith('.json'):
+			with open(path, 'w') as trace_file:
+				json.dump(rows, trace_file)
+			return
+		columns = []
+		for row in rows:
+			for column in row:
+				if not column in columns:
+					columns.append(column)
+		with open(path, 'w', newline='') as trace_file:
+			writer = csv.DictWriter(trace_file, columns, restval='')
+			writer.writeheader()
+			writer.writerows(rows)
+
+# On-screen table of the profiler's rolling statistics.  The table is only
+# re-rendered every refresh_frames frames, so it costs little to leave on.
+class PerformanceOverlay:
+	def __init__(self, profiler, font, refresh_frames=30, color=(255,255,0), background=(0,0,0)):
+		self.profiler = profiler
+		self.font = font
+		self.refresh_frames = refresh_frames
+		self.color = color
+		self.background = background
+		self.lines = []
+		self.frames_until_refresh = 0
+
+	def draw(self, surface, position):
+		if self.frames_until_refresh <= 0:
+			self.lines = [self.font.render(line, True, self.color, self.background) for line in self.profiler.overlay_lines()]
+			self.frames_until_refresh = self.refresh_frames
+		self.frames_until_refresh -= 1
+
+		x, y = position
+		for line in self.lines:
+			surface.blit(line, (x, y))
+			y += line.get_height()
@@ -0,0 +1,28 @@
+import itertools
+
+#
+# Typed entity registry.
+#
+# Each category is a container (usually a list) that its owner keeps up to date
+# as entities come and go; the registry only holds on to it.  Views are fixed,
+# ordered groups of categories, so iterating a view walks the live containers
+# directly instead of building a new list every time it is asked for.
+#
+# Views are live: don't add or remove entities while iterating one.
+#
+class EntityRegistry:
+	def __init__(self):
+		self.categories = {}
+		self.views = {}
+
+	def register(self, category, container):
+		self.categories[category] = container
+
+	def define_view(self, view, categories):
+		self.views[view] = tuple(self.categories[category] for category in categories)
+
+	def iterate(self, view):
+		return itertools.chain.from_iterable(self.views[view])
+
+	def counts(self):
+		return {category: len(container) for category, container in self.categories.items()}
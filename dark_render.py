@@ -0,0 +1,165 @@
+import pygame
+import pygame.display
+import pygame.transform
+
+#
+# Dirty rectangle renderer.
+#
+# Stands in for the display surface: anything drawn with blit() is only
+# recorded, then present() works out what changed since the last frame, clears
+# and redraws just those regions, and pushes only them to the display with
+# pygame.display.update(rects) instead of filling and flipping the whole screen.
+#
+# Images are compared by identity, so a sprite that changes its look must swap
+# in a different surface rather than drawing into the one it showed last frame.
+#
+class DirtyRectRenderer:
+	def __init__(self, surface, background=(0,0,0)):
+		self.surface = surface
+		self.background = background
+		self.previous = []
+		self.current = []
+		self.full_redraw = True
+
+	def get_size(self):
+		return self.surface.get_size()
+
+	def get_rect(self):
+		return self.surface.get_rect()
+
+	# Positions are truncated the same way Surface.blit truncates them.
+	def blit(self, image, position):
+		x, y = position
+		rect = pygame.Rect((int(x), int(y)), image.get_size())
+		self.current.append((image, rect))
+		return rect
+
+	def blits(self, blit_sequence, doreturn=True):
+		rects = [self.blit(image, position) for image, position in blit_sequence]
+		if doreturn:
+			return rects
+
+	# Draws the recorded frame, updates the display and returns the rects that changed.
+	def present(self):
+		current = self.current
+		self.current = []
+
+		if self.full_redraw:
+			self.full_redraw = False
+			self.previous = current
+			self.surface.fill(self.background)
+			for image, rect in current:
+				self.surface.blit(image, rect)
+			pygame.display.flip()
+			return [self.surface.get_rect()]
+
+		screen_rect = self.surface.get_rect()
+		previous_items = set((id(image), tuple(rect)) for image, rect in self.previous)
+		current_items = set((id(image), tuple(rect)) for image, rect in current)
+
+		dirty = []
+		for image, rect in self.previous:
+			if not (id(image), tuple(rect)) in current_items:
+				dirty.append(rect.clip(screen_rect))
+		for image, rect in current:
+			if not (id(image), tuple(rect)) in previous_items:
+				dirty.append(rect.clip(screen_rect))
+		dirty = [rect for rect in dirty if rect.width > 0 and rect.height > 0]
+
+		# Anything touching a cleared region has to be drawn again, in the original order,
+		# including sprites that did not change themselves (the planet under a bullet).
+		# Redraws are clipped to the region, so they can't spill over what was left alone.
+		if len(dirty) > 0:
+			current_rects = [rect for image, rect in current]
+			for dirty_rect in dirty:
+				self.surface.set_clip(dirty_rect)
+				self.surface.fill(self.background)
+				for index in dirty_rect.collidelistall(current_rects):
+					image, rect = current[index]
+					self.surface.blit(image, rect)
+			self.surface.set_clip(None)
+			pygame.display.update(dirty)
+
+		self.previous = current
+		return dirty
+
+#
+# Layered render queue.
+#
+# Sprites are queued as (image, position) pairs into named layers while a frame
+# is put together, then submit() draws the layers in order, each with a single
+# blits() call, so a frame costs one call per layer rather than one per sprite.
+# Within a layer, things are drawn in the order they were queued.
+#
+# The target can be a Surface or a DirtyRectRenderer.
+#
+# fit() draws a game area of one size onto a target of another: every layer
+# except the unscaled ones (the HUD, which is laid out at the target's size) is
+# scaled and letterboxed into it on submit.  Scaled images are cached by
+# identity, like the DirtyRectRenderer compares them.
+#
+LAYERS = ['planets', 'projectiles', 'ships', 'explosions', 'hud']
+
+class RenderQueue:
+	def __init__(self, layers=LAYERS, unscaled_layers=['hud']):
+		self.layer_names = list(layers)
+		self.layers = {name: [] for name in self.layer_names}
+		self.unscaled_layers = list(unscaled_layers)
+		self.scale = 1
+		self.offset = (0, 0)
+		self.scaled_images = {}
+
+	# Scales everything queued in game_size coordinates to fit target_size, keeping its shape.
+	def fit(self, game_size, target_size):
+		scale = min(target_size[0] / game_size[0], target_size[1] / game_size[1])
+		if scale != self.scale:
+			self.scaled_images.clear()
+		self.scale = scale
+		self.offset = ((target_size[0] - game_size[0] * scale) / 2, (target_size[1] - game_size[1] * scale) / 2)
+
+	def __scaled_image__(self, image):
+		scaled = self.scaled_images.get(image)
+		if scaled is None:
+			width, height = image.get_size()
+			scaled = pygame.transform.scale(image, (max(1, round(width * self.scale)), max(1, round(height * self.scale))))
+			color_key = image.get_colorkey()
+			if color_key != None:
+				scaled.set_colorkey(color_key)
+			self.scaled_images[image] = scaled
+		return scaled
+
+	def __scaled__(self, blit_sequence):
+		scale = self.scale
+		offset_x, offset_y = self.offset
+		return [(self.__scaled_image__(image), (x * scale + offset_x, y * scale + offset_y)) for image, (x, y) in blit_sequence]
+
+	def add(self, layer, image, position):
+		self.layers[layer].append((image, position))
+
+	def extend(self, layer, blit_sequence):
+		self.layers[layer].extend(blit_sequence)
+
+	# Something with a blit() that queues into one layer, for code that draws onto a surface.
+	def target(self, layer):
+		return LayerTarget(self.layers[layer])
+
+	def __len__(self):
+		return sum(len(blit_sequence) for blit_sequence in self.layers.values())
+
+	# Draws everything queued onto surface and empties the queue.
+	def submit(self, surface):
+		for name in self.layer_names:
+			blit_sequence = self.layers[name]
+			if len(blit_sequence) > 0:
+				if self.scale != 1 or self.offset != (0, 0):
+					if not name in self.unscaled_layers:
+						blit_sequence = self.__scaled__(blit_sequence)
+				surface.blits(blit_sequence, False)
+				self.layers[name].clear()
+
+class LayerTarget:
+	def __init__(self, blit_sequence):
+		self.blit_sequence = blit_sequence
+
+	def blit(self, image, position):
+		self.blit_sequence.append((image, position))
@@ -0,0 +1,63 @@
+import pygame
+import pygame.font
+
+#
+# Cached text rendering.
+#
+# Fonts are resolved once per (name, size), and rendered lines are kept by their
+# content, so text that doesn't change costs a few blits per frame instead of a
+# render call.  Unchanged text also keeps drawing the very same surfaces, which
+# is what dark_render.DirtyRectRenderer needs to leave it alone.
+#
+
+__font_cache__ = {}
+
+def load_font(name, size):
+	key = (name, size)
+	font = __font_cache__.get(key)
+	if font is None:
+		font = pygame.font.SysFont(name, size)
+		__font_cache__[key] = font
+	return font
+
+# Draws a list of lines, one under the other, or all on one line if a separator is given.
+class TextLayer:
+	def __init__(self, font, color=(255,255,255), background=(0,0,0), separator=None, maximum_cached_lines=64):
+		self.font = font
+		self.color = color
+		self.background = background
+		self.separator = separator
+		self.maximum_cached_lines = maximum_cached_lines
+		self.line_cache = {}
+		self.lines = ()
+		self.line_images = []
+
+	def __render_line__(self, line):
+		image = self.line_cache.get(line)
+		if image is None:
+			# Crude but enough: status text only ever cycles through a handful of lines.
+			if len(self.line_cache) >= self.maximum_cached_lines:
+				self.line_cache.clear()
+			image = self.font.render(line, True, self.color, self.background)
+			self.line_cache[line] = image
+		return image
+
+	# Only does any work when the lines differ from the last call.
+	def set_lines(self, lines):
+		lines = tuple(lines)
+		if lines == self.lines:
+			return
+		self.lines = lines
+		if len(lines) == 0:
+			self.line_images = []
+		elif self.separator != None:
+			self.line_images = [self.__render_line__(self.separator.join(lines))]
+		else:
+			self.line_images = [self.__render_line__(line) for line in lines]
+
+	# surface can be anything with a blit() method, such as a dark_render.DirtyRectRenderer.
+	def draw(self, surface, position):
+		x, y = position
+		for image in self.line_images:
+			surface.blit(image, (x, y))
+			y += image.get_height()
@@ -0,0 +1,126 @@
+import threading
+import time
+
+#
+# Fixed timestep accumulator.
+#
+# Real time is fed into an accumulator once per rendered frame, and drained in
+# whole simulation steps.  Whatever is left over (less than one step) is the
+# interpolation factor for drawing between the previous and current step.
+#
+# If the simulation falls too far behind, only maximum_steps_per_frame steps are
+# run and the rest of the backlog is dropped; the game slows down briefly rather
+# than spending ever longer catching up (the "spiral of death").
+#
+class FixedTimestep:
+	def __init__(self, steps_per_second=60, maximum_steps_per_frame=5, clock=time.perf_counter):
+		self.step_seconds = 1 / steps_per_second
+		self.maximum_steps_per_frame = maximum_steps_per_frame
+		self.clock = clock
+		self.accumulator = 0
+		self.previous_time = None
+		# Shown by the profiler, see space_war.start_round().
+		self.dropped_steps = 0
+
+	# Returns the number of simulation steps to run this frame.
+	def advance(self):
+		now = self.clock()
+		if self.previous_time == None:
+			self.previous_time = now
+			# Always start with one step, so the first frame has something to show.
+			return 1
+		self.accumulator += now - self.previous_time
+		self.previous_time = now
+
+		steps = int(self.accumulator / self.step_seconds)
+		self.accumulator -= steps * self.step_seconds
+		if steps > self.maximum_steps_per_frame:
+			self.dropped_steps += steps - self.maximum_steps_per_frame
+			steps = self.maximum_steps_per_frame
+		return steps
+
+	# How far between the last two steps the present moment is, from 0 to 1.
+	def interpolation(self):
+		return min(self.accumulator / self.step_seconds, 1)
+
+#
+# Frame pacer.
+#
+# Like pygame.time.Clock.tick(), frames are kept frame_seconds apart, but
+# instead of sleeping the pacer only says how long is left, so the caller can
+# get on with something useful (such as handling input) while it waits.  Frames
+# are due on a fixed schedule, so waking up late doesn't slow the frame rate
+# down, unless a whole frame was missed, when the schedule starts again.
+#
+class FramePacer:
+	def __init__(self, frames_per_second, clock=time.perf_counter):
+		self.frame_seconds = 1 / frames_per_second
+		self.clock = clock
+		self.deadline = clock()
+
+	# Seconds until the next frame is due, or 0 once it is.
+	def remaining(self):
+		return max(self.deadline - self.clock(), 0)
+
+	def next_frame(self):
+		self.deadline = max(self.deadline + self.frame_seconds, self.clock())
+
+#
+# Fixed rate thread.
+#
+# Calls step() steps_per_second times a second on a thread of its own, until it
+# returns False or stop() is called.  Like FixedTimestep, it catches up on steps
+# it was late for, but at most maximum_catch_up_steps at a time, dropping the
+# rest of the backlog.
+#
+class FixedRateThread(threading.Thread):
+	def __init__(self, step, steps_per_second=60, maximum_catch_up_steps=5, clock=time.perf_counter):
+		super().__init__(daemon=True)
+		self.step = step
+		self.step_seconds = 1 / steps_per_second
+		self.maximum_catch_up_steps = maximum_catch_up_steps
+		self.clock = clock
+		self.stopping = threading.Event()
+		self.step_count = 0
+		self.dropped_steps = 0
+
+	def stop(self):
+		self.stopping.set()
+		self.join()
+
+	def run(self):
+		next_time = self.clock()
+		while not self.stopping.is_set():
+			now = self.clock()
+			if now < next_time:
+				self.stopping.wait(next_time - now)
+				continue
+
+			steps = 0
+			while next_time <= now and steps < self.maximum_catch_up_steps:
+				carry_on = self.step()
+				self.step_count += 1
+				if not carry_on:
+					return
+				next_time += self.step_seconds
+				steps += 1
+			if next_time <= now:
+				late_steps = int((now - next_time) / self.step_seconds) + 1
+				self.dropped_steps += late_steps
+				next_time += late_steps * self.step_seconds
+
+#
+# Hands the latest of a series of immutable snapshots from one thread to
+# another.  The producer builds each snapshot in full before publishing it, and
+# publishing only swaps a reference, so the reader never sees one half built
+# and neither side ever waits for the other.
+#
+class SnapshotExchange:
+	def __init__(self):
+		self.snapshot = None
+
+	def publish(self, snapshot):
+		self.snapshot = snapshot
+
+	def latest(self):
+		return self.snapshot
@@ -1,4 +1,11 @@
+import argparse
 import ctypes
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
 import pygame
 import pygame.locals
 import pygame.math
@@ -7,45 +14,235 @@ import pygame.joystick
 from dark_math import *
 from dark_image import *
 import dark_motion
+import dark_entity_store
+import dark_broad_phase
+import dark_timing
+import dark_render
+import dark_registry
+import dark_profile
+import dark_text
+import dark_input_log
+import dark_gravity
+import dark_integrator
+import dark_atlas
+import dark_latency
 
 # set dark_image default transparency
 set_color_key((0,0,0))
 
+# Connected joysticks, maintained by hotplug events in handle_events.
+joysticks = {}
+joystick_instances = []
+
+alliance_score = 0
+federation_score = 0
+
 class Sprite:
 	def __init__(self, image, position):
 		self.image = image
 		self.position = position
 
-	def draw(self, surface):
-		surface.blit(self.image, self.position)
-
 	def get_rect(self):
 		rect = self.image.get_rect()
 		rect.x, rect.y = self.position
 		return rect
 
+	def get_mask(self):
+		# Rebuilt only when the image is swapped out.
+		if getattr(self, 'mask_image', None) is not self.image:
+			self.mask = mask_from_image(self.image)
+			self.mask_image = self.image
+		return self.mask
+
 class RotatableImage():
-	def __init__(self, image, rotation_offset_degrees):
+	def __init__(self, image, rotation_offset_degrees, rotation_steps=360):
 		self.image = image
 		self.rotation_offset_degrees = rotation_offset_degrees
 
+		# Rotated frames are cached by quantized angle, so the cache never holds more
+		# than rotation_steps surfaces no matter how many objects share this image.
+		self.rotation_steps = rotation_steps
+		self.rotated_frames = {}
+		self.rotated_masks = {}
+
+	def __quantize__(self, direction_degrees):
+		return round((direction_degrees + self.rotation_offset_degrees) * self.rotation_steps / 360) % self.rotation_steps
+
+	def get_rotated(self, direction_degrees):
+		step = self.__quantize__(direction_degrees)
+		frame = self.rotated_frames.get(step)
+		if frame is None:
+			frame = rotate_image_circular(self.image, step * 360 / self.rotation_steps)
+			self.rotated_frames[step] = frame
+		return frame
+
+	# Collision mask for the frame get_rotated() returns, built once per angle.
+	def get_mask(self, direction_degrees):
+		step = self.__quantize__(direction_degrees)
+		mask = self.rotated_masks.get(step)
+		if mask is None:
+			mask = mask_from_image(self.get_rotated(direction_degrees), (0,0,0))
+			self.rotated_masks[step] = mask
+		return mask
+
+	def prerender(self):
+		for step in range(self.rotation_steps):
+			direction_degrees = step * 360 / self.rotation_steps - self.rotation_offset_degrees
+			self.get_rotated(direction_degrees)
+			self.get_mask(direction_degrees)
+
+# Like the dark_image cache, but for rotatable images, so their rotated frames also
+# survive from one round to the next.
+__rotatable_image_cache__ = {}
+
+def load_rotatable_image(path, size, rotation_offset_degrees):
+	key = (path, size, rotation_offset_degrees)
+	rotatable_image = __rotatable_image_cache__.get(key)
+	if rotatable_image is None:
+		rotatable_image = RotatableImage(load_image(path, size), rotation_offset_degrees)
+		__rotatable_image_cache__[key] = rotatable_image
+	return rotatable_image
+
+def load_team_images(team_name):
+	fighter_size = (50,50)
+	bullet_size = (10,10)
+	image_rotation_offset = -90
+
+	fighter_image = load_rotatable_image(f"images/fighter_{team_name}.png", fighter_size, image_rotation_offset)
+	thrusters_image = load_rotatable_image(f"images/fighter_{team_name}_thrusters.png", fighter_size, image_rotation_offset)
+	bullet_image = load_rotatable_image(f"images/bullet_{team_name}.png", bullet_size, image_rotation_offset)
+	explosion_image = load_image('images/explosion.png')
+
+	return fighter_image, thrusters_image, bullet_image, explosion_image
+
+def load_planet_image():
+	return load_image('images/planet.png', (100,100))
+
+def load_moon_image():
+	return load_image('images/planet.png', (40,40))
+
+# Load every asset a round needs, so that starting a round never touches storage.
+def preload_assets(prerender_rotations=False):
+	for team_name in ['alliance', 'federation']:
+		fighter_image, thrusters_image, bullet_image, explosion_image = load_team_images(team_name)
+		load_explosion_frames(explosion_image, fighter_image.image.get_size())
+		if prerender_rotations:
+			for rotatable_image in [fighter_image, thrusters_image, bullet_image]:
+				rotatable_image.prerender()
+	load_planet_image()
+	load_moon_image()
+
+# The whole animation of an explosion, one frame per tick, baked once and shared by
+# every explosion of the same image and size.  Ticks that come out the same size
+# share a surface.  Frames past baked_ticks are added on demand.
+class ExplosionFrames:
+	def __init__(self, raw_explosion_image, maximum_size, animation_ticks=180, baked_ticks=360, frames_by_size=None):
+		self.raw_explosion_image = raw_explosion_image
+		self.maximum_size = maximum_size
+		self.animation_ticks = animation_ticks
+		# Sizes already drawn elsewhere, such as in an atlas, are used as they are.
+		if frames_by_size == None:
+			frames_by_size = {}
+		self.frames_by_size = frames_by_size
+		self.frames = []
+		self.get_frame(baked_ticks - 1)
+
+	def get_size_frame(self, size):
+		frame = self.frames_by_size.get(size)
+		if frame is None:
+			frame = pygame.Surface(self.maximum_size)
+			frame.fill((0,0,0))
+			frame.set_colorkey((0,0,0))
+			explosion_image = pygame.transform.scale(self.raw_explosion_image, size)
+			scale_offset = div2(sub2(self.maximum_size, size),2)
+			frame.blit(explosion_image, scale_offset)
+			self.frames_by_size[size] = frame
+		return frame
+
+	def get_frame(self, tick):
+		while len(self.frames) <= tick:
+			scale = dark_motion.ease_in_out_bounce(len(self.frames)/self.animation_ticks)
+			size = max2(floor2(mul2(self.maximum_size, scale)), (0,0))
+			self.frames.append(self.get_size_frame(size))
+		return self.frames[tick]
+
+__explosion_frames_cache__ = {}
+
+def load_explosion_frames(raw_explosion_image, maximum_size):
+	# The cached frames keep the raw image alive, so its id can't be reused.
+	key = (id(raw_explosion_image), tuple(maximum_size))
+	explosion_frames = __explosion_frames_cache__.get(key)
+	if explosion_frames is None:
+		explosion_frames = ExplosionFrames(raw_explosion_image, tuple(maximum_size))
+		__explosion_frames_cache__[key] = explosion_frames
+	return explosion_frames
+
+#
+# Asset atlases.
+#
+# bake_atlas() writes everything in the image, rotated frame and explosion frame
+# caches to one dark_atlas file, and install_atlas() puts it all back, so that
+# preload_assets() then finds everything cached and starting the game touches
+# no PNG at all.  Bake with space_war_bake.py.
+#
+
+__installed_atlases__ = []
+
+def bake_atlas(path):
+	entries = []
+	image_keys = {}
+	for (image_path, size, color_key), image in cached_images():
+		entries.append((['image', image_path, size, color_key], image))
+		image_keys[id(image)] = [image_path, size, color_key]
+	for (image_path, size, rotation_offset_degrees), rotatable_image in __rotatable_image_cache__.items():
+		for step, frame in sorted(rotatable_image.rotated_frames.items()):
+			entries.append((['rotation', image_path, size, rotation_offset_degrees, rotatable_image.rotation_steps, step], frame))
+	for (image_id, maximum_size), explosion_frames in __explosion_frames_cache__.items():
+		for size, frame in explosion_frames.frames_by_size.items():
+			entries.append((['explosion', image_keys[image_id], maximum_size, size], frame))
+	dark_atlas.write_atlas(path, entries)
+	return len(entries)
+
+def install_atlas(path, convert=True):
+	atlas = dark_atlas.load_atlas(path, convert)
+	__installed_atlases__.append(atlas)
+
+	images = {}
+	rotations = []
+	explosions = {}
+	for key, surface in atlas.entries:
+		kind = key[0]
+		if kind == 'image':
+			kind, image_path, size, color_key = key
+			cache_image(image_path, size, color_key, surface)
+			images[json.dumps(key[1:])] = surface
+		elif kind == 'rotation':
+			rotations.append((key, surface))
+		elif kind == 'explosion':
+			kind, image_key, maximum_size, size = key
+			frames_by_size = explosions.setdefault((json.dumps(image_key), tuple(maximum_size)), {})
+			frames_by_size[tuple(size)] = surface
+
+	# Frames belong to images, which are all cached by now.
+	for (kind, image_path, size, rotation_offset_degrees, rotation_steps, step), frame in rotations:
+		rotatable_image = load_rotatable_image(image_path, tuple(size), rotation_offset_degrees)
+		if rotatable_image.rotation_steps == rotation_steps:
+			rotatable_image.rotated_frames[step] = frame
+	for (image_key, maximum_size), frames_by_size in explosions.items():
+		raw_explosion_image = images[image_key]
+		key = (id(raw_explosion_image), maximum_size)
+		__explosion_frames_cache__[key] = ExplosionFrames(raw_explosion_image, maximum_size, frames_by_size=frames_by_size)
+	return len(atlas)
+
 class Explosion(Sprite):
-	def __init__(self, raw_explosion_image, maximum_rect):
+	# fighter is the Fighter that went up, kept so snapshots can tell the explosions apart.
+	def __init__(self, raw_explosion_image, maximum_rect, fighter):
 		self.raw_explosion_image = raw_explosion_image
+		self.fighter = fighter
 		self.maximum_rect = maximum_rect
-		self.set_size(maximum_rect.size)
+		self.explosion_frames = load_explosion_frames(raw_explosion_image, maximum_rect.size)
 		self.lifetime_tick_count = 0
-		super().__init__(raw_explosion_image, maximum_rect.topleft)
-
-	def set_size(self, size):
-		if not hasattr(self, 'image') or not are_equal2(size, self.image.get_size()):
-			print(f"Size: {size}")
-			self.image = pygame.Surface(self.maximum_rect.size)
-			self.image.fill((0,0,0))
-			self.image.set_colorkey((0,0,0))
-			explosion_image = pygame.transform.scale(self.raw_explosion_image, size)
-			scale_offset = div2(sub2(self.maximum_rect.size, size),2)
-			self.image.blit(explosion_image, scale_offset)
+		super().__init__(self.explosion_frames.get_frame(0), maximum_rect.topleft)
 
 	def tick(self):
 		self.lifetime_tick_count +=1
@@ -53,14 +250,12 @@ class Explosion(Sprite):
 	def get_lifetime_tick_count(self):
 		return self.lifetime_tick_count
 
-	def draw(self, surface):
-		scale = dark_motion.ease_in_out_bounce(self.lifetime_tick_count/180)
-		size = max2(floor2(mul2(self.maximum_rect.size, scale)), (0,0))
-		self.set_size(size)
-		surface.blit(self.image, self.maximum_rect.topleft)
-
 # TODO: In the future, an object should be able to be multiple sprites.
 class SpaceObject(Sprite):
+	# Set while the object's physical state lives in a dark_entity_store.EntityStore.
+	entity_store = None
+	entity_slot = None
+
 	def __init__(self, position, velocity, direction, rotatable_image):
 		super().__init__(rotatable_image.image, position)
 		self.velocity = velocity
@@ -73,18 +268,67 @@ class SpaceObject(Sprite):
 
 	def set_rotatable_image(self, rotatable_image):
 		self.rotatable_image = rotatable_image
+		self.image = rotatable_image.get_rotated(self.direction)
+
+	def attach_to_store(self, entity_store, lifetime=None):
+		self.entity_slot = entity_store.attach(
+			self,
+			self.position,
+			self.velocity,
+			self.direction,
+			self.image.get_size(),
+			lifetime,
+			self.previous_position
+		)
+		self.entity_store = entity_store
+		self.__class__ = stored_class(type(self))
+
+	# Takes a copy of the object's state back out of the store.
+	def detach_from_store(self):
+		position, previous_position, velocity, direction = self.position, self.previous_position, self.velocity, self.direction
+		self.entity_store.detach(self.entity_slot)
+		self.__class__ = self.unstored_class
+		self.entity_store = None
+		self.entity_slot = None
+		self.position, self.previous_position, self.velocity, self.direction = position, previous_position, velocity, direction
+
+	def get_mask(self):
+		return self.rotatable_image.get_mask(self.direction)
 
 	def accelerate(self, force):
 		self.velocity = add2(self.velocity, force)
 
-	def tick(self):
+	# The acceleration the object gives itself this tick, on top of gravity.
+	def thrust(self):
+		return (0,0)
+
+	def move(self):
+		self.previous_position = self.position
 		self.position = add2(self.position, self.velocity)
-		self.image = rotate_image_circular(
-			self.rotatable_image.image, 
-			self.direction + self.rotatable_image.rotation_offset_degrees
-		)
+
+	# Everything a tick does besides moving, for when something else moves the object.
+	def update(self):
+		self.image = self.rotatable_image.get_rotated(self.direction)
+
+	def tick(self):
+		# Objects in an entity store are moved by the store, in one batch for all of them.
+		if self.entity_store == None:
+			self.move()
+		self.update()
+
+	# Where to draw the object, interpolation of the way through the last step, for
+	# renderers that run between steps.
+	def draw_position(self, interpolation=1):
+		if interpolation == 1:
+			return self.position
+		previous_position = self.previous_position
+		return add2(previous_position, mul2(sub2(self.position, previous_position), interpolation))
 
 class Bullet(SpaceObject):
+	# Set while the bullet is in flight for a BulletPool.
+	pool = None
+	pool_index = None
+
 	def __init__(self, position, velocity, direction, bullet_rot_image):
 		self.lifetime_tick_count = 0
 		super().__init__(
@@ -94,13 +338,139 @@ class Bullet(SpaceObject):
 			bullet_rot_image
 		)
 
-	def tick(self):
-		self.lifetime_tick_count += 1
-		super().tick()
+	# Puts a spent bullet back in flight, exactly as if it had just been constructed.
+	def respawn(self, position, velocity, direction):
+		self.lifetime_tick_count = 0
+		self.position = position
+		self.velocity = velocity
+		self.direction = direction
+		self.tick()
+
+	def attach_to_store(self, entity_store):
+		super().attach_to_store(entity_store, self.lifetime_tick_count)
+
+	def detach_from_store(self):
+		lifetime_tick_count = self.lifetime_tick_count
+		super().detach_from_store()
+		self.lifetime_tick_count = lifetime_tick_count
+
+	def update(self):
+		# The entity store ages its bullets itself.
+		if self.entity_store == None:
+			self.lifetime_tick_count += 1
+		super().update()
 
 	def get_lifetime_tick_count(self):
 		return self.lifetime_tick_count
 
+#
+# Space objects attached to an entity store.
+#
+# While attached, an object's class is swapped for a subclass of its own whose
+# physical state reads and writes the store, so objects outside a store keep
+# plain attributes and pay nothing for it.
+#
+class StoredSpaceObject:
+	@property
+	def position(self):
+		return self.entity_store.get_position(self.entity_slot)
+
+	@position.setter
+	def position(self, position):
+		self.entity_store.position[self.entity_slot] = position
+
+	# Where the object was before the last tick.
+	@property
+	def previous_position(self):
+		return self.entity_store.get_previous_position(self.entity_slot)
+
+	@previous_position.setter
+	def previous_position(self, previous_position):
+		self.entity_store.previous_position[self.entity_slot] = previous_position
+
+	@property
+	def velocity(self):
+		return self.entity_store.get_velocity(self.entity_slot)
+
+	@velocity.setter
+	def velocity(self, velocity):
+		self.entity_store.velocity[self.entity_slot] = velocity
+
+	@property
+	def direction(self):
+		return self.entity_store.get_direction(self.entity_slot)
+
+	@direction.setter
+	def direction(self, direction):
+		self.entity_store.direction[self.entity_slot] = direction
+
+	# Only bullets are attached with a lifetime.
+	@property
+	def lifetime_tick_count(self):
+		return self.entity_store.get_lifetime(self.entity_slot)
+
+	@lifetime_tick_count.setter
+	def lifetime_tick_count(self, lifetime_tick_count):
+		self.entity_store.lifetime[self.entity_slot] = lifetime_tick_count
+
+__stored_classes__ = {}
+
+def stored_class(unstored_class):
+	cls = __stored_classes__.get(unstored_class)
+	if cls is None:
+		cls = type(f"Stored{unstored_class.__name__}", (StoredSpaceObject, unstored_class), {'unstored_class': unstored_class})
+		__stored_classes__[unstored_class] = cls
+	return cls
+
+#
+# Preallocated bullets for one team.
+#
+# Spent bullets go on a free list and are respawned instead of constructing new
+# ones, so rapid fire doesn't churn allocations.  The bullets in flight are kept
+# in active, and each knows its index there, so releasing one is a swap with the
+# last bullet rather than a search.  If the pool runs dry it grows.
+#
+class BulletPool:
+	def __init__(self, bullet_rot_image, capacity):
+		self.bullet_rot_image = bullet_rot_image
+		self.active = []
+		self.free = []
+		for index in range(capacity):
+			self.free.append(Bullet((0,0), (0,0), 0, bullet_rot_image))
+
+	def contains(self, bullet):
+		return getattr(bullet, 'pool', None) is self
+
+	def __activate__(self, bullet):
+		bullet.pool = self
+		bullet.pool_index = len(self.active)
+		self.active.append(bullet)
+		return bullet
+
+	def acquire(self, position, velocity, direction):
+		if len(self.free) > 0:
+			bullet = self.free.pop()
+			bullet.respawn(position, velocity, direction)
+		else:
+			bullet = Bullet(position, velocity, direction, self.bullet_rot_image)
+		return self.__activate__(bullet)
+
+	# A bullet put in flight as it is, for callers that set all of its state themselves.
+	def take(self):
+		if len(self.free) > 0:
+			return self.__activate__(self.free.pop())
+		return self.__activate__(Bullet((0,0), (0,0), 0, self.bullet_rot_image))
+
+	def release(self, bullet):
+		index = bullet.pool_index
+		last = self.active.pop()
+		if not last is bullet:
+			self.active[index] = last
+			last.pool_index = index
+		bullet.pool = None
+		bullet.pool_index = None
+		self.free.append(bullet)
+
 class Fighter(SpaceObject):
 	def __init__(self, position, direction, fighter_rot_image, bullet_rot_image, thrusters_rot_image, explosion_image):
 		self.fighter_rot_image = fighter_rot_image
@@ -110,6 +480,7 @@ class Fighter(SpaceObject):
 
 		self.rotation_speed = 2
 		self.thruster_power = 0.15
+		self.bullet_speed = 5
 		self.show_thrusters = False
 		self.exploded = False
 
@@ -120,25 +491,33 @@ class Fighter(SpaceObject):
 			fighter_rot_image
 		)
 
-	def fire_bullet(self):
+	# Where a bullet fired right now starts, and how it moves.
+	def bullet_launch(self):
 		# TODO: Adjust these
 		position = add2(self.position, mul2((20, 20), degrees_to_normal2(self.direction)))
-		velocity = add2(self.velocity, mul2((5, 5), degrees_to_normal2(self.direction)))
-
-		bullet = Bullet(position, velocity, self.direction, self.bullet_rot_image)
+		velocity = add2(self.velocity, mul2((self.bullet_speed, self.bullet_speed), degrees_to_normal2(self.direction)))
+		return position, velocity, self.direction
 
-		return bullet
+	def fire_bullet(self, bullet_pool=None):
+		position, velocity, direction = self.bullet_launch()
+		if bullet_pool == None:
+			return Bullet(position, velocity, direction, self.bullet_rot_image)
+		return bullet_pool.acquire(position, velocity, direction)
 
 	def explode(self):
 		if self.exploded == False:
 			self.exploded = True
-			explosion = Explosion(self.fighter_explosion_image, self.get_rect())
+			explosion = Explosion(self.fighter_explosion_image, self.get_rect(), self)
 			return explosion
 
-	def __fire_thrusters__(self):
+	def thrust(self):
+		if self.show_thrusters == False:
+			return (0,0)
 		# TODO: Adjust these
-		force = mul2(degrees_to_normal2(self.direction), self.thruster_power)
-		self.accelerate(force)
+		return mul2(degrees_to_normal2(self.direction), self.thruster_power)
+
+	def __fire_thrusters__(self):
+		self.accelerate(self.thrust())
 
 	def thrusters_on(self):
 		self.show_thrusters = True
@@ -152,40 +531,357 @@ class Fighter(SpaceObject):
 	def rotate_anticlockwise(self):
 		self.direction = (self.direction + self.rotation_speed) % 360
 	
+	def update(self):
+		# The image (and so the collision mask) is picked here rather than in draw(),
+		# so a tick plays out the same whether or not anything gets drawn.
+		if self.show_thrusters == True:
+			self.rotatable_image = self.thrusters_rot_image
+		else:
+			self.rotatable_image = self.fighter_rot_image
+		super().update()
+
 	def tick(self):
 		super().tick()
+		# Arena's own step adds the thrust after moving, for the next tick.  An
+		# integrator takes it along with gravity instead, and only calls update().
 		if self.show_thrusters == True:
 			self.__fire_thrusters__()
 
-	def draw(self, surface):
-		if self.exploded == False:
-			if self.show_thrusters == True:
-				self.set_rotatable_image(self.thrusters_rot_image)
-			else:
-				self.set_rotatable_image(self.fighter_rot_image)
-			super().draw(surface)
-
 class Planet(Sprite):
 	def __init__(self, planet_image, position):
 		super().__init__(planet_image, position)
 		self.gravity_strength = 0.05
 
-	def assert_gravity_force(self, space_object):
-		force = mul2(normal2(sub2(self.get_rect().center, space_object.get_rect().center)), self.gravity_strength)
-		space_object.accelerate(force)
+	# The planet as a body for dark_gravity.
+	def gravity_body(self):
+		return self.get_rect().center, self.gravity_strength
+
+# The input state for one fighter for one tick.
+# rotate follows the sign of the stick: -1 is anticlockwise, +1 is clockwise.
+class Controls:
+	def __init__(self, rotate=0, thrusters=False, fire=False):
+		self.rotate = rotate
+		self.thrusters = thrusters
+		self.fire = fire
+
+def controls_from_axes(axis_rotate, axis_thruster, fire=False):
+	rotate = 0
+	if axis_rotate < -0.1:
+		rotate = -1
+	if axis_rotate > +0.1:
+		rotate = +1
+	return Controls(rotate, axis_thruster > +0.1, fire)
+
+#
+# What the players are holding, as last reported by their controllers.
+#
+# Axis movement events don't "repeat", they only fire if the axis value changes.
+# So the last axis values are remembered and turned into Controls every
+# simulation step, simulating a "repeat" style input.  A button press is
+# latched until the next step takes it, so it only fires once.
+#
+# Events are handled on the main thread, as SDL requires, while a threaded round
+# takes the controls on its simulation thread, hence the lock.
+#
+# Each event comes with the time it was handled.  Given a dark_latency.InputLatency,
+# every step tells it which events it answered, so their latency can be measured
+# once the step is on screen.
+#
+class InputState:
+	def __init__(self, latency=None):
+		self.lock = threading.Lock()
+		self.axes = [(0, 0), (0, 0)]
+		self.fire = [False, False]
+		self.latency = latency
+		# The oldest event from each player that no step has taken yet.
+		self.event_times = [None, None]
+		self.step_count = 0
+
+	def __stamp__(self, player, event_time):
+		if event_time != None and self.event_times[player] == None:
+			self.event_times[player] = event_time
+
+	def set_axes(self, player, axis_rotate, axis_thruster, event_time=None):
+		with self.lock:
+			self.axes[player] = (axis_rotate, axis_thruster)
+			self.__stamp__(player, event_time)
+
+	def press_fire(self, player, event_time=None):
+		with self.lock:
+			self.fire[player] = True
+			self.__stamp__(player, event_time)
+
+	# Returns (alliance controls, federation controls) for one step, the
+	# step_count'th.
+	def take_controls(self):
+		with self.lock:
+			controls = [controls_from_axes(axis_rotate, axis_thruster, fire) for (axis_rotate, axis_thruster), fire in zip(self.axes, self.fire)]
+			self.fire = [False, False]
+			self.step_count += 1
+			if self.latency != None:
+				for player, event_time in enumerate(self.event_times):
+					if event_time != None:
+						self.latency.applied(self.step_count, player, event_time)
+			self.event_times = [None, None]
+		return controls[0], controls[1]
+
+	# Stops timing the events so far, which no step is going to answer soon,
+	# such as while the round waits for controllers.
+	def forget_event_times(self):
+		with self.lock:
+			self.event_times = [None, None]
+
+# Feeds one event into input_state, stamped with the time it is handled.
+# Returns True when the player asked to quit.
+def handle_event(event, input_state, options):
+	if event.type == pygame.locals.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+		return True
+
+	if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+		options.profile = not options.profile
+
+	if event.type == pygame.JOYAXISMOTION:
+		joystick = joysticks[event.instance_id]
+		joystick_index = joystick_instances.index(event.instance_id)
+		if joystick_index < 2:
+			input_state.set_axes(joystick_index, joystick.get_axis(0), joystick.get_axis(5), time.perf_counter())
+
+	if event.type == pygame.JOYBUTTONDOWN:
+		joystick_index = joystick_instances.index(event.instance_id)
+		if event.button == 0 and joystick_index < 2:
+			input_state.press_fire(joystick_index, time.perf_counter())
+
+	# Handle hotplugging
+	if event.type == pygame.JOYDEVICEADDED:
+		# This event will be generated when the program starts for every
+		# joystick, filling up the list without needing to create them manually.
+		joy = pygame.joystick.Joystick(event.device_index)
+		joy_instance = joy.get_instance_id()
+		joysticks[joy_instance] = joy
+		joystick_instances.append(joy_instance)
+
+		print(f"Joystick {joy.get_instance_id()} ({len(joystick_instances)}) connected.")
+
+	if event.type == pygame.JOYDEVICEREMOVED:
+		del joysticks[event.instance_id]
+		joystick_instances.remove(event.instance_id)
+		print(f"Joystick {event.instance_id} {len(joystick_instances) + 1} disconnected.")
+	return False
+
+# Handles every pending event.  Returns True when the player asked to quit.
+def handle_events(input_state, options):
+	for event in pygame.event.get():
+		if handle_event(event, input_state, options):
+			return True
+	return False
+
+#
+# Waits until the next frame is due, see dark_timing.FramePacer.
+#
+# Rather than sleeping, it handles events the moment they arrive.  Their times
+# are then when they arrived rather than when the frame got round to them, and
+# a threaded round's simulation picks them up on its very next step instead of
+# the next frame's.  Returns True when the player asked to quit.
+#
+def wait_for_frame(pacer, input_state, options):
+	while True:
+		remaining = pacer.remaining()
+		if remaining <= 0:
+			break
+		event = pygame.event.wait(max(1, int(remaining * 1000)))
+		if event.type != pygame.NOEVENT and handle_event(event, input_state, options):
+			return True
+	pacer.next_frame()
+	return False
+
+# Controls packed into one byte of an input log, see dark_input_log.
+def controls_to_byte(controls):
+	return dark_input_log.pack_input(controls.rotate, controls.thrusters, controls.fire)
+
+def controls_from_byte(value):
+	return Controls(*dark_input_log.unpack_input(value))
+
+# Input log header flags, for the Arena settings that change how a round plays out.
+RECORDING_PIXEL_COLLISIONS = 1
+# The gravity engine, in bits 1-2, since the engines round differently once there is more than one planet.
+RECORDING_GRAVITY_SHIFT = 1
+RECORDING_GRAVITY_MASK = 3
+# Moons from Arena.add_moons, in bits 4-7.
+RECORDING_MOONS_SHIFT = 4
+RECORDING_MOONS_MAXIMUM = 15
+# The integrator method in bits 8-9, and its most substeps in bits 10-15.
+RECORDING_INTEGRATOR_SHIFT = 8
+RECORDING_INTEGRATOR_MASK = 3
+RECORDING_SUBSTEPS_SHIFT = 10
+RECORDING_SUBSTEPS_MASK = 63
+
+# An argparse type for a whole number from minimum to maximum, for the options an
+# input log only has so many bits for.
+def bounded_int(minimum, maximum):
+	def number(text):
+		value = int(text)
+		if value < minimum or value > maximum:
+			raise argparse.ArgumentTypeError(f"{value} is not from {minimum} to {maximum}")
+		return value
+	return number
+
+def start_recording(path, arena, ticks_per_second):
+	moons = len(arena.planets) - 1
+	if moons > RECORDING_MOONS_MAXIMUM:
+		raise ValueError(f"Input logs hold at most {RECORDING_MOONS_MAXIMUM} moons")
+	flags = 0
+	if arena.pixel_collisions:
+		flags |= RECORDING_PIXEL_COLLISIONS
+	flags |= dark_gravity.engine_names.index(arena.gravity.name) << RECORDING_GRAVITY_SHIFT
+	flags |= moons << RECORDING_MOONS_SHIFT
+	if arena.integrator != None:
+		if arena.integrator.maximum_substeps > RECORDING_SUBSTEPS_MASK:
+			raise ValueError(f"Input logs hold at most {RECORDING_SUBSTEPS_MASK} substeps")
+		flags |= dark_integrator.method_names.index(arena.integrator.method) << RECORDING_INTEGRATOR_SHIFT
+		flags |= arena.integrator.maximum_substeps << RECORDING_SUBSTEPS_SHIFT
+	return dark_input_log.InputRecorder(path, 2, ticks_per_second, arena.size, flags)
+
+# A fresh Arena set up the way the one an input log was recorded from was.
+def create_recorded_arena(screen, log, use_entity_store=False):
+	gravity_name = dark_gravity.engine_names[(log.flags >> RECORDING_GRAVITY_SHIFT) & RECORDING_GRAVITY_MASK]
+	integrator_name = dark_integrator.method_names[(log.flags >> RECORDING_INTEGRATOR_SHIFT) & RECORDING_INTEGRATOR_MASK]
+	arena = Arena(
+		screen,
+		use_entity_store,
+		pixel_collisions=log.flags & RECORDING_PIXEL_COLLISIONS != 0,
+		gravity=dark_gravity.create_engine(gravity_name, screen.get_size()),
+		integrator=dark_integrator.create_integrator(integrator_name, (log.flags >> RECORDING_SUBSTEPS_SHIFT) & RECORDING_SUBSTEPS_MASK)
+	)
+	arena.add_moons((log.flags >> RECORDING_MOONS_SHIFT) & RECORDING_MOONS_MAXIMUM)
+	return arena
+
+#
+# Arena snapshots.
+#
+# The whole simulation state of an Arena, including the scores, packed with
+# struct into one fixed layout: a header, both fighters, the alliance bullets,
+# the federation bullets and then the explosions.  The header carries the
+# counts, and the struct for the rest is built once per combination of counts.
+#
+# Only state is stored, never surfaces: restoring takes bullets from the pools
+# and rebuilds explosions from the fighters' images.
+#
+
+SNAPSHOT_MAGIC = b'SWSN'
+SNAPSHOT_VERSION = 1
+
+# magic, version, tick countdown (-1 for none), outcome, alliance score, federation score,
+# alliance bullets, federation bullets, explosions
+__snapshot_header__ = struct.Struct('<4sHiBIIHHH')
+
+# position, previous position, velocity, direction, thrusters, exploded, showing the thrusters image
+__snapshot_fighter_format__ = '7d???'
+# position, previous position, velocity, direction, lifetime
+__snapshot_bullet_format__ = '7di'
+# the fighter that exploded (0 alliance, 1 federation), lifetime, maximum rect
+__snapshot_explosion_format__ = 'Bi4i'
+
+__snapshot_outcomes__ = [None, 'alliance', 'federation', 'draw']
+
+__snapshot_body_cache__ = {}
+
+def __snapshot_body__(alliance_bullet_count, federation_bullet_count, explosion_count):
+	key = (alliance_bullet_count, federation_bullet_count, explosion_count)
+	body = __snapshot_body_cache__.get(key)
+	if body is None:
+		body = struct.Struct('<'
+			+ __snapshot_fighter_format__ * 2
+			+ __snapshot_bullet_format__ * (alliance_bullet_count + federation_bullet_count)
+			+ __snapshot_explosion_format__ * explosion_count
+		)
+		__snapshot_body_cache__[key] = body
+	return body
+
+#
+# Everything needed to draw one simulation step, taken by Arena.render_state().
+#
+# A threaded round's simulation thread publishes a new one after every step
+# and never changes it again, so the drawing thread can keep drawing whichever
+# it last picked up while the next step is being simulated.  Moving objects are
+# (image, previous position, position), so they can be drawn in between steps.
+#
+class RenderState:
+	def __init__(self, published_time, input_step, planets, projectiles, ships, explosions, text):
+		self.published_time = published_time
+		# The InputState step it shows the outcome of, for dark_latency.
+		self.input_step = input_step
+		self.planets = planets
+		self.projectiles = projectiles
+		self.ships = ships
+		self.explosions = explosions
+		self.text = text
+
+	def __interpolated__(self, moving, interpolation):
+		if interpolation == 1:
+			return [(image, position) for image, previous_position, position in moving]
+		return [(image, add2(previous_position, mul2(sub2(position, previous_position), interpolation))) for image, previous_position, position in moving]
+
+	# The same sprites, in the same layers, as Arena.queue_sprites() queues.
+	def queue_sprites(self, render_queue, interpolation=1):
+		render_queue.extend('planets', self.planets)
+		render_queue.extend('projectiles', self.__interpolated__(self.projectiles, interpolation))
+		render_queue.extend('ships', self.__interpolated__(self.ships, interpolation))
+		render_queue.extend('explosions', self.explosions)
+
+	def counts(self):
+		return {'projectiles': len(self.projectiles), 'ships': len(self.ships), 'explosions': len(self.explosions)}
 
 class Arena:
-	def __init__(self, screen):
+	def __init__(self, screen, use_entity_store=False, broad_phase=None, pixel_collisions=True, profiler=None, gravity=None, integrator=None, size=None):
 
 		self.screen = screen
+		# The playfield, in game coordinates.  It is the screen's size unless the
+		# arena is drawn scaled, see dark_render.RenderQueue.fit().
+		self.size = size
+		if size == None:
+			self.size = screen.get_size()
 		self.text = ['Loaded arena']
 		self.bullet_maximum = 5
-		self.alliance_bullets = []
-		self.federation_bullets = []
 		self.explosions = []
 
 		self.tick_countdown = None
 
+		# 'alliance', 'federation' or 'draw' once the round has been decided.
+		self.outcome = None
+
+		# Optionally keep fighter and bullet physics in NumPy arrays, see dark_entity_store.
+		self.entity_store = None
+		if use_entity_store:
+			if dark_entity_store.is_available():
+				self.entity_store = dark_entity_store.EntityStore()
+			else:
+				print("NumPy is not installed, falling back to per-object physics.")
+
+		# Picks the bullet/fighter pairs worth an exact collision test, see dark_broad_phase.
+		if broad_phase == None:
+			broad_phase = dark_broad_phase.SpatialHashBroadPhase()
+		self.broad_phase = broad_phase
+
+		# Pulls everything that moves towards every planet, see dark_gravity.
+		if gravity == None:
+			gravity = dark_gravity.ObjectGravity()
+		self.gravity = gravity
+
+		# None moves everything with Arena's own step, one per tick.  A dark_integrator.Integrator
+		# moves it with a more stable method instead, splitting steps near planets if asked to.
+		self.integrator = integrator
+
+		# Follow up rect overlaps with an exact test on the (cached) sprite masks.
+		self.pixel_collisions = pixel_collisions
+
+		# Collects the sprites for draw(), layer by layer.
+		self.render_queue = dark_render.RenderQueue()
+
+		# Times each phase of tick(), see dark_profile.
+		if profiler == None:
+			profiler = dark_profile.NullProfiler()
+		self.profiler = profiler
+
 		# About 3 seconds * 60 fps = 180 ticks.
 		self.maximum_bullet_lifetime_ticks = 180
 
@@ -205,7 +901,7 @@ class Arena:
 			fighter_direction_alliance
 		)
 
-		fighter_position_federation = sub2(screen.get_size(), mul2((2,2), fighter_offset))
+		fighter_position_federation = sub2(self.size, mul2((2,2), fighter_offset))
 		fighter_direction_federation = normal_to_degrees2(normal2((-3,-2)))
 
 		self.fighter_federation = self.__load_fighter_team__(
@@ -214,37 +910,85 @@ class Arena:
 			fighter_direction_federation
 		)
 
+		#
+		# Bullets in flight come from a preallocated pool per team.
+		# These lists belong to the pools, so they must never be replaced.
+		#
+		self.alliance_bullet_pool = BulletPool(self.fighter_alliance.bullet_rot_image, self.bullet_maximum)
+		self.alliance_bullets = self.alliance_bullet_pool.active
+		self.federation_bullet_pool = BulletPool(self.fighter_federation.bullet_rot_image, self.bullet_maximum)
+		self.federation_bullets = self.federation_bullet_pool.active
+
 		#
 		# Create planet
 		#
-		planet_size = (100,100)
-		planet_image = load_image('images/planet.png', planet_size)
-		planet_position = sub2(div2(screen.get_size(), 2), div2(planet_size, 2))
+		planet_image = load_planet_image()
+		planet_position = sub2(div2(self.size, 2), div2(planet_image.get_size(), 2))
 
 		self.planet = Planet(planet_image, planet_position)
 
-	def __load_fighter_team__(self, team_name, fighter_position, fighter_direction):
-
-		fighter_size = (50,50)
-		bullet_size = (10,10)
-		image_rotation_offset = -90
-
-		fighter_image = RotatableImage(
-			load_image(f"images/fighter_{team_name}.png", fighter_size),
-			image_rotation_offset
-		)
+		if self.entity_store != None:
+			self.fighter_alliance.attach_to_store(self.entity_store)
+			self.fighter_federation.attach_to_store(self.entity_store)
 
-		thrusters_image = RotatableImage(
-			load_image(f"images/fighter_{team_name}_thrusters.png", fighter_size),
-			image_rotation_offset
-		)
+		#
+		# Everything in the arena, by kind.  The registry holds on to the live lists
+		# above, so the views below never need rebuilding, see dark_registry.
+		#
+		self.fighters = [self.fighter_alliance, self.fighter_federation]
+		# The first planet is always self.planet, in the middle; add_planet() adds more.
+		self.planets = [self.planet]
+
+		self.registry = dark_registry.EntityRegistry()
+		self.registry.register('fighters', self.fighters)
+		self.registry.register('alliance_bullets', self.alliance_bullets)
+		self.registry.register('federation_bullets', self.federation_bullets)
+		self.registry.register('planets', self.planets)
+		self.registry.register('explosions', self.explosions)
+
+		self.registry.define_view('moveable', ['fighters', 'alliance_bullets', 'federation_bullets'])
+		self.registry.define_view('tickable', ['fighters', 'alliance_bullets', 'federation_bullets', 'explosions'])
+		self.registry.define_view('limited_lifespan', ['alliance_bullets', 'federation_bullets', 'explosions'])
+		# What still ticks one object at a time when the entity store moves the rest.
+		self.registry.define_view('self_ticking', ['fighters', 'explosions'])
+
+	# Another planet (or moon) centred on center.  Planets never move.
+	def add_planet(self, planet_image, center, gravity_strength=0.05):
+		planet = Planet(planet_image, sub2(center, div2(planet_image.get_size(), 2)))
+		planet.gravity_strength = gravity_strength
+		self.planets.append(planet)
+		return planet
+
+	# count moons spaced evenly around the middle planet, orbit_radius from its centre.
+	def add_moons(self, count, orbit_radius=None, gravity_strength=0.02):
+		if orbit_radius == None:
+			orbit_radius = min(self.size) / 3
+		moon_image = load_moon_image()
+		center = self.planet.get_rect().center
+		for index in range(count):
+			offset = mul2(degrees_to_normal2(index * 360 / count), orbit_radius)
+			self.add_planet(moon_image, add2(center, offset), gravity_strength)
+
+	# Balancing knobs, by name.  "thruster_power" sets it for both fighters, "alliance.thruster_power" for one.
+	fighter_parameters = ['thruster_power', 'rotation_speed', 'bullet_speed']
+	planet_parameters = ['gravity_strength']
+
+	def apply_parameters(self, parameters):
+		teams = {'': self.fighters, 'alliance': [self.fighter_alliance], 'federation': [self.fighter_federation]}
+		for name, value in parameters.items():
+			team, separator, attribute = name.rpartition('.')
+			if attribute in self.fighter_parameters and team in teams:
+				for fighter in teams[team]:
+					setattr(fighter, attribute, value)
+			elif attribute in self.planet_parameters and team == '':
+				for planet in self.planets:
+					setattr(planet, attribute, value)
+			else:
+				raise ValueError(f"Unknown parameter {name}")
 
-		bullet_image = RotatableImage(
-			load_image(f"images/bullet_{team_name}.png", bullet_size),
-			image_rotation_offset
-		)
+	def __load_fighter_team__(self, team_name, fighter_position, fighter_direction):
 
-		explosion_image = load_image('images/explosion.png')
+		fighter_image, thrusters_image, bullet_image, explosion_image = load_team_images(team_name)
 
 		return Fighter(
 			fighter_position,
@@ -255,78 +999,158 @@ class Arena:
 			explosion_image
 		)
 
-	def __space_objects__(self):
-		return [self.fighter_alliance, self.fighter_federation] + self.alliance_bullets + self.federation_bullets
-
-	def drawable(self):
-		return self.__space_objects__() + [self.planet] + self.explosions
-
+	# These are live views: don't add or remove anything while iterating one.
 	def tickable(self):
-		return self.__space_objects__() + self.explosions
+		return self.registry.iterate('tickable')
 
 	def moveable(self):
-		return self.__space_objects__()
+		return self.registry.iterate('moveable')
 
 	def limited_lifespan(self):
-		return self.alliance_bullets + self.federation_bullets + self.explosions
+		return self.registry.iterate('limited_lifespan')
 
 	def add_alliance_bullet(self):
 		if len(self.alliance_bullets) >= self.bullet_maximum:
 			return
-		bullet = self.fighter_alliance.fire_bullet()
-		self.alliance_bullets.append(bullet)
+		bullet = self.fighter_alliance.fire_bullet(self.alliance_bullet_pool)
+		if self.entity_store != None:
+			bullet.attach_to_store(self.entity_store)
 
 	def remove_alliance_bullet(self, bullet):
-		if not bullet in self.alliance_bullets:
+		if not self.alliance_bullet_pool.contains(bullet):
 			return
-		self.alliance_bullets.remove(bullet)
+		if bullet.entity_store != None:
+			bullet.detach_from_store()
+		self.alliance_bullet_pool.release(bullet)
 
 	def add_federation_bullet(self):
 		if len(self.federation_bullets) >= self.bullet_maximum:
 			return
-		bullet = self.fighter_federation.fire_bullet()
-		self.federation_bullets.append(bullet)
+		bullet = self.fighter_federation.fire_bullet(self.federation_bullet_pool)
+		if self.entity_store != None:
+			bullet.attach_to_store(self.entity_store)
 
 	def remove_federation_bullet(self, bullet):
-		if not bullet in self.federation_bullets:
+		if not self.federation_bullet_pool.contains(bullet):
 			return
-		self.federation_bullets.remove(bullet)
+		if bullet.entity_store != None:
+			bullet.detach_from_store()
+		self.federation_bullet_pool.release(bullet)
+
+	def __apply_fighter_controls__(self, fighter, controls):
+		if controls.rotate < 0:
+			fighter.rotate_anticlockwise()
+		if controls.rotate > 0:
+			fighter.rotate_clockwise()
+		if controls.thrusters:
+			fighter.thrusters_on()
+		else:
+			fighter.thrusters_off()
+
+	def apply_controls(self, alliance_controls, federation_controls):
+		if alliance_controls.fire:
+			self.add_alliance_bullet()
+		if federation_controls.fire:
+			self.add_federation_bullet()
+		self.__apply_fighter_controls__(self.fighter_alliance, alliance_controls)
+		self.__apply_fighter_controls__(self.fighter_federation, federation_controls)
+
+	def collides(self, sprite, other):
+		rect = sprite.get_rect()
+		other_rect = other.get_rect()
+		if not rect.colliderect(other_rect):
+			return False
+		if not self.pixel_collisions:
+			return True
+		return sprite.get_mask().overlap(other.get_mask(), (other_rect.x - rect.x, other_rect.y - rect.y)) != None
+
+	def gravity_bodies(self):
+		return [planet.gravity_body() for planet in self.planets]
+
+	# Gravity at any points, and where the planets are, for self.integrator.
+	def __gravity_pull__(self):
+		bodies = self.gravity_bodies()
+		def pull(centers):
+			return self.gravity.accelerations(centers, bodies)
+		return pull, [center for center, strength in bodies]
 
 	def tick(self):
 		global alliance_score
 		global federation_score
 
-		for moveable in self.moveable():
-			self.planet.assert_gravity_force(moveable)
+		profiler = self.profiler
+
+		if self.entity_store == None:
+			with profiler.measure('gravity'):
+				if self.integrator == None:
+					self.gravity.apply(self.gravity_bodies(), self.moveable())
 
-		for tickable in self.tickable():
-			tickable.tick()
+			with profiler.measure('tick'):
+				if self.integrator == None:
+					for tickable in self.tickable():
+						tickable.tick()
+				else:
+					# The integrator works gravity out as it goes.
+					self.integrator.advance_objects(self.moveable(), *self.__gravity_pull__())
+					for moveable in self.moveable():
+						moveable.update()
+					for explosion in self.explosions:
+						explosion.tick()
+
+			with profiler.measure('expiry'):
+				expired = []
+				for limited in self.limited_lifespan():
+					if limited.get_lifetime_tick_count() > self.maximum_bullet_lifetime_ticks:
+						expired.append(limited)
+		else:
+			# Gravity, movement and bullet ageing for everything in the store in one batch.
+			# Bullets never turn, so only fighters and explosions still tick one by one.
+			with profiler.measure('gravity'):
+				if self.integrator == None:
+					self.gravity.apply_to_store(self.gravity_bodies(), self.entity_store)
+
+			with profiler.measure('tick'):
+				if self.integrator == None:
+					self.entity_store.move()
+					for tickable in self.registry.iterate('self_ticking'):
+						tickable.tick()
+				else:
+					self.entity_store.integrate(self.integrator, *self.__gravity_pull__(), self.fighters)
+					for fighter in self.fighters:
+						fighter.update()
+					for explosion in self.explosions:
+						explosion.tick()
 
-		for limited in self.limited_lifespan():
-			if limited.get_lifetime_tick_count() > self.maximum_bullet_lifetime_ticks:
+			with profiler.measure('expiry'):
+				expired = self.entity_store.expired(self.maximum_bullet_lifetime_ticks)
+
+		with profiler.measure('expiry'):
+			for limited in expired:
 				# we don't know which collection it's in but these methods check that for us.
 				self.remove_alliance_bullet(limited)
 				self.remove_federation_bullet(limited)
 
-		alliance_collide = False
-		federation_collide = False
-
-		# Planet collision
-		if self.fighter_alliance.get_rect().colliderect(self.planet.get_rect()):
-			alliance_collide = True
-		if self.fighter_federation.get_rect().colliderect(self.planet.get_rect()):
-			federation_collide = True
-		# Fighter-on-fighter collision
-		if self.fighter_alliance.get_rect().colliderect(self.fighter_federation.get_rect()):
-			alliance_collide = True
-			federation_collide = True
-		# Bullet collision - no friendly fire
-		for bullet in self.federation_bullets:
-			if self.fighter_alliance.get_rect().colliderect(bullet.get_rect()):
+		with profiler.measure('collision'):
+			alliance_collide = False
+			federation_collide = False
+
+			# Planet collision
+			for planet in self.planets:
+				if self.collides(self.fighter_alliance, planet):
+					alliance_collide = True
+				if self.collides(self.fighter_federation, planet):
+					federation_collide = True
+			# Fighter-on-fighter collision
+			if self.collides(self.fighter_alliance, self.fighter_federation):
 				alliance_collide = True
-		for bullet in self.alliance_bullets:
-			if self.fighter_federation.get_rect().colliderect(bullet.get_rect()):
 				federation_collide = True
+			# Bullet collision - no friendly fire, so each fighter is only tested against enemy bullets.
+			for fighter, bullet in self.broad_phase.candidate_pairs([self.fighter_alliance], self.federation_bullets):
+				if self.collides(fighter, bullet):
+					alliance_collide = True
+			for fighter, bullet in self.broad_phase.candidate_pairs([self.fighter_federation], self.alliance_bullets):
+				if self.collides(fighter, bullet):
+					federation_collide = True
 
 		if alliance_collide:
 			explosion = self.fighter_alliance.explode()
@@ -342,127 +1166,337 @@ class Arena:
 		if self.tick_countdown == None:
 
 			if alliance_collide or federation_collide:
-				self.text.clear()
 				if not alliance_collide and federation_collide:
-					self.text.append("Alliance win.")
+					self.outcome = 'alliance'
 					alliance_score += 1
 				elif alliance_collide and not federation_collide:
-					self.text.append("Federation win.")
+					self.outcome = 'federation'
 					federation_score += 1
 				else:
-					self.text.append("It's a draw.")
+					self.outcome = 'draw'
 
-				self.text.append(f"Alliance Score {alliance_score}")
-				self.text.append(f"Federation Score {federation_score}")
+				self.__announce_outcome__()
 
 				self.tick_countdown = 300
 	
 		if not self.tick_countdown == None:
 			self.tick_countdown -= 1
 
+	def __announce_outcome__(self):
+		self.text.clear()
+		if self.outcome == 'alliance':
+			self.text.append("Alliance win.")
+		elif self.outcome == 'federation':
+			self.text.append("Federation win.")
+		else:
+			self.text.append("It's a draw.")
+		self.text.append(f"Alliance Score {alliance_score}")
+		self.text.append(f"Federation Score {federation_score}")
+
 	def is_alive(self):
 		return self.tick_countdown == None or self.tick_countdown > 0
 
-	def draw(self):
-		for drawable in self.drawable():
-			drawable.draw(self.screen)
-
-def start_round(screen_handle):
+	# A hash of everything that decides how the round plays out from here, to check replays against.
+	# Bullets are sorted first, so the digest only depends on where they are, not on their order in the pools.
+	def state_digest(self):
+		digest = hashlib.sha256()
+		for fighter in self.fighters:
+			digest.update(struct.pack('<7d??',
+				*fighter.position, *fighter.previous_position, *fighter.velocity, fighter.direction,
+				fighter.show_thrusters, fighter.exploded
+			))
+		for bullets in [self.alliance_bullets, self.federation_bullets]:
+			for position, velocity, direction, lifetime in sorted((bullet.position, bullet.velocity, bullet.direction, bullet.lifetime_tick_count) for bullet in bullets):
+				digest.update(struct.pack('<5di', *position, *velocity, direction, lifetime))
+			digest.update(b'|')
+		for explosion in self.explosions:
+			digest.update(struct.pack('<i', explosion.get_lifetime_tick_count()))
+		tick_countdown = self.tick_countdown
+		if tick_countdown == None:
+			tick_countdown = -1
+		digest.update(struct.pack('<i', tick_countdown))
+		digest.update(str(self.outcome).encode())
+		return digest.digest()
+
+	def snapshot(self):
+		values = []
+		for fighter in self.fighters:
+			values.extend(fighter.position)
+			values.extend(fighter.previous_position)
+			values.extend(fighter.velocity)
+			values.append(fighter.direction)
+			values.append(fighter.show_thrusters)
+			values.append(fighter.exploded)
+			values.append(fighter.rotatable_image is fighter.thrusters_rot_image)
+		for bullets in [self.alliance_bullets, self.federation_bullets]:
+			for bullet in bullets:
+				values.extend(bullet.position)
+				values.extend(bullet.previous_position)
+				values.extend(bullet.velocity)
+				values.append(bullet.direction)
+				values.append(bullet.lifetime_tick_count)
+		for explosion in self.explosions:
+			values.append(self.fighters.index(explosion.fighter))
+			values.append(explosion.lifetime_tick_count)
+			values.extend(explosion.maximum_rect)
+
+		tick_countdown = self.tick_countdown
+		if tick_countdown == None:
+			tick_countdown = -1
+		header = __snapshot_header__.pack(
+			SNAPSHOT_MAGIC, SNAPSHOT_VERSION, tick_countdown, __snapshot_outcomes__.index(self.outcome),
+			alliance_score, federation_score,
+			len(self.alliance_bullets), len(self.federation_bullets), len(self.explosions)
+		)
+		body = __snapshot_body__(len(self.alliance_bullets), len(self.federation_bullets), len(self.explosions))
+		return header + body.pack(*values)
 
-	global joysticks
-	global joystick_instances
+	# Puts the arena (and the scores) back exactly as they were when the snapshot was taken.
+	def restore(self, snapshot):
+		global alliance_score
+		global federation_score
 
-	font = pygame.font.SysFont('arial', 32)
-	arena = Arena(screen_handle)
-	clock = pygame.time.Clock()
+		magic, version, tick_countdown, outcome, alliance_score, federation_score, alliance_bullet_count, federation_bullet_count, explosion_count = __snapshot_header__.unpack_from(snapshot)
+		if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+			raise ValueError(f"Not a version {SNAPSHOT_VERSION} arena snapshot")
+		values = __snapshot_body__(alliance_bullet_count, federation_bullet_count, explosion_count).unpack_from(snapshot, __snapshot_header__.size)
+
+		had_outcome = self.outcome != None
+		self.tick_countdown = tick_countdown if tick_countdown >= 0 else None
+		self.outcome = __snapshot_outcomes__[outcome]
+		if self.outcome != None:
+			self.__announce_outcome__()
+		elif had_outcome:
+			self.text.clear()
+
+		index = 0
+		for fighter in self.fighters:
+			fighter.position = values[index:index + 2]
+			fighter.previous_position = values[index + 2:index + 4]
+			fighter.velocity = values[index + 4:index + 6]
+			fighter.direction = values[index + 6]
+			fighter.show_thrusters = values[index + 7]
+			fighter.exploded = values[index + 8]
+			fighter.set_rotatable_image(fighter.thrusters_rot_image if values[index + 9] else fighter.fighter_rot_image)
+			index += 10
+
+		for bullet in list(self.alliance_bullets):
+			self.remove_alliance_bullet(bullet)
+		for bullet in list(self.federation_bullets):
+			self.remove_federation_bullet(bullet)
+		for pool, count in [(self.alliance_bullet_pool, alliance_bullet_count), (self.federation_bullet_pool, federation_bullet_count)]:
+			for bullet_index in range(count):
+				bullet = pool.take()
+				bullet.position = values[index:index + 2]
+				bullet.previous_position = values[index + 2:index + 4]
+				bullet.velocity = values[index + 4:index + 6]
+				bullet.direction = values[index + 6]
+				bullet.lifetime_tick_count = values[index + 7]
+				bullet.image = bullet.rotatable_image.get_rotated(bullet.direction)
+				if self.entity_store != None:
+					bullet.attach_to_store(self.entity_store)
+				index += 8
+
+		self.explosions.clear()
+		for explosion_index in range(explosion_count):
+			fighter = self.fighters[values[index]]
+			explosion = Explosion(fighter.fighter_explosion_image, pygame.Rect(values[index + 2:index + 6]), fighter)
+			explosion.lifetime_tick_count = values[index + 1]
+			self.explosions.append(explosion)
+			index += 6
+
+	# (image, position) for each object, see SpaceObject.draw_position().
+	def __blit_sequence__(self, space_objects, interpolation):
+		if self.entity_store != None:
+			slots = [space_object.entity_slot for space_object in space_objects]
+			images = [space_object.image for space_object in space_objects]
+			return list(zip(images, self.entity_store.interpolated_positions(slots, interpolation)))
+		if interpolation == 1:
+			return [(space_object.image, space_object.position) for space_object in space_objects]
+		return [(space_object.image, space_object.draw_position(interpolation)) for space_object in space_objects]
+
+	# Queues every sprite into its dark_render layer, without any per-sprite draw() calls.
+	def queue_sprites(self, render_queue, interpolation=1):
+		render_queue.extend('planets', [(planet.image, planet.position) for planet in self.planets])
+		render_queue.extend('projectiles', self.__blit_sequence__(self.alliance_bullets, interpolation))
+		render_queue.extend('projectiles', self.__blit_sequence__(self.federation_bullets, interpolation))
+		fighters = [fighter for fighter in self.fighters if fighter.exploded == False]
+		render_queue.extend('ships', self.__blit_sequence__(fighters, interpolation))
+		for explosion in self.explosions:
+			explosion.image = explosion.explosion_frames.get_frame(explosion.lifetime_tick_count)
+			render_queue.add('explosions', explosion.image, explosion.maximum_rect.topleft)
+
+	# (image, previous position, position) for each object, see RenderState.
+	def __moving_state__(self, space_objects):
+		images = [space_object.image for space_object in space_objects]
+		if self.entity_store != None:
+			slots = [space_object.entity_slot for space_object in space_objects]
+			previous_positions = [tuple(position) for position in self.entity_store.previous_position[slots].tolist()]
+			positions = [tuple(position) for position in self.entity_store.position[slots].tolist()]
+			return list(zip(images, previous_positions, positions))
+		return [(space_object.image, space_object.previous_position, space_object.position) for space_object in space_objects]
+
+	# A RenderState of the arena as it is now, which later ticks leave alone.
+	def render_state(self, published_time, input_step=0):
+		fighters = [fighter for fighter in self.fighters if fighter.exploded == False]
+		return RenderState(
+			published_time,
+			input_step,
+			[(planet.image, planet.position) for planet in self.planets],
+			self.__moving_state__(self.alliance_bullets) + self.__moving_state__(self.federation_bullets),
+			self.__moving_state__(fighters),
+			[(explosion.explosion_frames.get_frame(explosion.lifetime_tick_count), explosion.maximum_rect.topleft) for explosion in self.explosions],
+			list(self.text)
+		)
 
-	alliance_axis_rotate = 0
-	alliance_axis_thruster = 0
+	# surface can be anything with a blits() method, such as a dark_render.DirtyRectRenderer.
+	def draw(self, interpolation=1, surface=None):
+		if surface == None:
+			surface = self.screen
+		self.queue_sprites(self.render_queue, interpolation)
+		self.render_queue.submit(surface)
 
-	federation_axis_rotate = 0
-	federation_axis_thruster = 0
+#
+# Everything a round is played with, built once whichever loop then plays it,
+# see start_round() and run_threaded_round().
+#
+# recording_path, if given, is where this round's input log is written, see dark_input_log.
+class RoundContext:
+	def __init__(self, screen_handle, options, profiler=None, recording_path=None):
+		self.screen_handle = screen_handle
+		self.options = options
+
+		# The status line is only rendered again when arena.text changes, see dark_text.
+		self.font = dark_text.load_font('arial', 32)
+		self.status_text = dark_text.TextLayer(self.font, separator='; ')
+
+		# Per-phase frame timings, allocation and entity counts, see dark_profile.
+		# F3 shows or hides the overlay while profiling.
+		self.overlay = None
+		if profiler == None:
+			profiler = dark_profile.NullProfiler()
+		else:
+			self.overlay = dark_profile.PerformanceOverlay(profiler, dark_text.load_font('consolas,couriernew,monospace', 16))
+		self.profiler = profiler
+
+		# The playfield keeps its size whatever size it is drawn at, see init().
+		arena_size = screen_handle.get_size()
+		if options.arena_size != None:
+			arena_size = tuple(options.arena_size)
+
+		gravity = dark_gravity.create_engine(options.gravity, arena_size)
+		integrator = dark_integrator.create_integrator(options.integrator, options.substeps)
+		# The arena's tick phases are timed on whichever thread ticks it, so a threaded
+		# round only profiles its frames.
+		arena_profiler = profiler
+		if options.threaded:
+			arena_profiler = dark_profile.NullProfiler()
+		self.arena = Arena(screen_handle, options.entity_store, pixel_collisions=not options.rect_collisions, profiler=arena_profiler, gravity=gravity, integrator=integrator, size=arena_size)
+		self.arena.add_moons(options.moons)
+
+		# Frames are paced by handling input while waiting for the next one, see wait_for_frame().
+		self.pacer = None
+		if options.render_rate > 0:
+			self.pacer = dark_timing.FramePacer(options.render_rate)
+
+		# Optionally only redraw and push the parts of the screen that changed, see dark_render.
+		# Sprites, then the text over them, are drawn a layer at a time, see dark_render.RenderQueue.
+		self.render_queue = dark_render.RenderQueue()
+		self.render_queue.fit(self.arena.size, screen_handle.get_size())
+		self.hud = self.render_queue.target('hud')
+
+		self.renderer = None
+		if options.dirty_rects:
+			self.renderer = dark_render.DirtyRectRenderer(screen_handle)
+
+		self.recorder = None
+		if recording_path != None:
+			self.recorder = start_recording(recording_path, self.arena, options.simulation_rate)
+
+		# Optionally time every player's input until it is on screen, see dark_latency.
+		self.latency = None
+		if options.input_latency or options.input_latency_output != None:
+			self.latency = dark_latency.InputLatency(['Alliance', 'Federation'])
+		self.input_state = InputState(self.latency)
+
+	def finish(self):
+		options = self.options
+		if options.profile_trace != None:
+			self.profiler.dump(options.profile_trace)
+		if options.input_latency:
+			for line in self.latency.report_lines():
+				print(line)
+		if options.input_latency_output != None:
+			with open(options.input_latency_output, 'w') as latency_file:
+				json.dump(self.latency.to_dict(), latency_file, indent=1)
+		if self.recorder != None:
+			self.recorder.close(self.arena.state_digest())
+
+	def quit_game(self):
+		self.finish()
+		pygame.quit()
+		quit()
+
+	# One simulation step with whatever the players are holding right now.
+	def simulate(self):
+		alliance_controls, federation_controls = self.input_state.take_controls()
+		if self.recorder != None:
+			self.recorder.record(controls_to_byte(alliance_controls), controls_to_byte(federation_controls))
+		self.arena.apply_controls(alliance_controls, federation_controls)
+		self.arena.tick()
+
+	def await_controllers(self):
+		self.input_state.forget_event_times()
+		self.arena.text.clear()
+		self.arena.text.append(f"Awaiting {2 - len(joystick_instances)} controllers to connect....")
+
+# recording_path, if given, is where this round's input log is written, see dark_input_log.
+def start_round(screen_handle, options, profiler=None, recording_path=None):
+	context = RoundContext(screen_handle, options, profiler, recording_path)
+	if options.threaded:
+		run_threaded_round(context)
+	else:
+		run_single_threaded_round(context)
+	context.finish()
+
+def run_single_threaded_round(context):
+	screen_handle, options, arena, profiler = context.screen_handle, context.options, context.arena, context.profiler
+	input_state, latency, pacer = context.input_state, context.latency, context.pacer
+	render_queue, hud, renderer = context.render_queue, context.hud, context.renderer
+	status_text, overlay, font = context.status_text, context.overlay, context.font
+	simulate, await_controllers, quit_game = context.simulate, context.await_controllers, context.quit_game
+
+	# The simulation runs at a fixed rate whatever the frame rate, see dark_timing.
+	timestep = dark_timing.FixedTimestep(options.simulation_rate, options.maximum_catch_up_steps)
 
 	while arena.is_alive():
-		for event in pygame.event.get():
-			if event.type == pygame.locals.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
-				pygame.quit()
-				quit()
-			else:
+		profiler.begin_frame()
 
-				if event.type == pygame.JOYAXISMOTION:
-					joystick = joysticks[event.instance_id]
-					joystick_index = joystick_instances.index(event.instance_id)
-
-					if joystick_index == 0:
-						alliance_axis_rotate = joystick.get_axis(0)
-						alliance_axis_thruster = joystick.get_axis(5)
-					if joystick_index == 1:
-						federation_axis_rotate = joystick.get_axis(0)
-						federation_axis_thruster = joystick.get_axis(5)
-
-				if event.type == pygame.JOYBUTTONDOWN:
-					joystick_index = joystick_instances.index(event.instance_id)
-					if event.button == 0 and joystick_index == 0:
-						arena.add_alliance_bullet()
-					if event.button == 0 and joystick_index == 1:
-						arena.add_federation_bullet()
-
-				if event.type == pygame.JOYBUTTONUP:
-					pass
-
-				# Handle hotplugging
-				if event.type == pygame.JOYDEVICEADDED:
-					# This event will be generated when the program starts for every
-					# joystick, filling up the list without needing to create them manually.
-					joy = pygame.joystick.Joystick(event.device_index)
-					joy_instance = joy.get_instance_id()
-					joysticks[joy_instance] = joy
-					joystick_instances.append(joy_instance)
-
-					print(f"Joystick {joy.get_instance_id()} ({len(joystick_instances)}) connected.")
-
-				if event.type == pygame.JOYDEVICEREMOVED:
-					del joysticks[event.instance_id]
-					joystick_instances.remove(event.instance_id)
-					print(f"Joystick {event.instance_id} {len(joystick_instances) + 1} disconnected.")
+		with profiler.measure('input'):
+			if handle_events(input_state, options):
+				quit_game()
+
+		steps = timestep.advance()
 
 		if len(joystick_instances) < 2:
-			arena.text.clear()
-			arena.text.append(f"Awaiting {2 - len(joystick_instances)} controllers to connect....")
+			await_controllers()
 		else:
-
-			#
-			# Tick helpers for rotation and thrusters.
-			#
-			# Basically, axis movement events don't "repeat", they only fire if the axis value changes.
-			# So, we remember the last axis value in case there's no event, and then keep firing off
-			# tick level methods based on that remembered value, simulating a "repeat" style input.
-			#
-			if alliance_axis_rotate < -0.1:
-				arena.fighter_alliance.rotate_anticlockwise()
-			if alliance_axis_rotate > +0.1:
-				arena.fighter_alliance.rotate_clockwise()
-			if alliance_axis_thruster > +0.1:
-				arena.fighter_alliance.thrusters_on()
-			else:
-				arena.fighter_alliance.thrusters_off()
-
-			if federation_axis_rotate < -0.1:
-				arena.fighter_federation.rotate_anticlockwise()
-			if federation_axis_rotate > +0.1:
-				arena.fighter_federation.rotate_clockwise()
-			if federation_axis_thruster > +0.1:
-				arena.fighter_federation.thrusters_on()
-			else:
-				arena.fighter_federation.thrusters_off()
-
-			arena.tick()
+			# A button press only fires once, however many steps this frame catches up on.
+			for step in range(steps):
+				if not arena.is_alive():
+					break
+				simulate()
 
 		#
-		# Draw game
+		# Draw game, in between the last two simulation steps.
 		#
-		screen_handle.fill((0,0,0))
-		arena.draw()
+		with profiler.measure('draw'):
+			if renderer == None:
+				screen_handle.fill((0,0,0))
+				draw_target = screen_handle
+			else:
+				draw_target = renderer
+			arena.queue_sprites(render_queue, timestep.interpolation())
 
 		#
 		# Debug/diagnositics/text display
@@ -474,10 +1508,15 @@ def start_round(screen_handle):
 			arena.text.append(f"Degrees {directional.direction}")
 		'''
 
-		if len(arena.text) > 0:
-			text_to_render = '; '.join(arena.text)
-			textimage = font.render(text_to_render,True,(255,255,255),(0,0,0))
-			screen_handle.blit(textimage, (0,0))
+		with profiler.measure('text'):
+			status_text.set_lines(arena.text)
+			status_text.draw(hud, (0,0))
+
+			if overlay != None and options.profile:
+				overlay.draw(hud, (0, font.get_linesize()))
+
+		with profiler.measure('draw'):
+			render_queue.submit(draw_target)
 		
 		'''
 		# debug rectangles
@@ -490,26 +1529,195 @@ def start_round(screen_handle):
 			endpoint = add2(startpoint, mul2(degrees_to_normal2(directional.direction), 100))
 			pygame.draw.line(screen_handle, (255,0,0), startpoint, endpoint, 3)
 		'''
-		pygame.display.flip()
-		clock.tick(60)
+		with profiler.measure('flip'):
+			if renderer == None:
+				pygame.display.flip()
+			else:
+				renderer.present()
+		if latency != None:
+			latency.presented(input_state.step_count, time.perf_counter())
+
+		with profiler.measure('wait'):
+			if pacer != None and wait_for_frame(pacer, input_state, options):
+				quit_game()
+
+		if profiler.enabled:
+			profiler.count('steps', steps)
+			# Steps skipped so far this round, each one a moment the game slowed down.
+			profiler.count('dropped_steps', timestep.dropped_steps)
+			for category, count in arena.registry.counts().items():
+				profiler.count(category, count)
+		profiler.end_frame()
 
-def init():
+#
+# Threaded rounds.
+#
+# The simulation runs on a thread of its own at a fixed rate, and publishes a
+# RenderState after every step.  This thread only handles events and draws
+# whichever state is newest, so a flip that blocks on vsync no longer holds up
+# the next step or the reading of the controls.  Pygame lets go of the GIL while
+# it flips and waits, so the simulation carries on meanwhile.
+#
+# Only the simulation thread touches the arena once it has started; the two
+# threads share nothing but the InputState and the published states.
+#
+def run_threaded_round(context):
+	screen_handle, options, arena, profiler = context.screen_handle, context.options, context.arena, context.profiler
+	input_state, latency, pacer = context.input_state, context.latency, context.pacer
+	render_queue, hud, renderer = context.render_queue, context.hud, context.renderer
+	status_text, overlay, font = context.status_text, context.overlay, context.font
+	simulate, await_controllers, quit_game = context.simulate, context.await_controllers, context.quit_game
+
+	exchange = dark_timing.SnapshotExchange()
+	step_seconds = 1 / options.simulation_rate
+
+	def step():
+		if len(joystick_instances) < 2:
+			await_controllers()
+		else:
+			simulate()
+		exchange.publish(arena.render_state(time.perf_counter(), input_state.step_count))
+		return arena.is_alive()
+
+	exchange.publish(arena.render_state(time.perf_counter(), input_state.step_count))
+	simulation = dark_timing.FixedRateThread(step, options.simulation_rate, options.maximum_catch_up_steps)
+	simulation.start()
+
+	previous_step_count = 0
+	while simulation.is_alive():
+		profiler.begin_frame()
+
+		with profiler.measure('input'):
+			if handle_events(input_state, options):
+				simulation.stop()
+				quit_game()
+
+		# Drawn in between the state before the latest step and the latest, like the
+		# single threaded game does.
+		state = exchange.latest()
+		interpolation = min((time.perf_counter() - state.published_time) / step_seconds, 1)
+
+		with profiler.measure('draw'):
+			if renderer == None:
+				screen_handle.fill((0,0,0))
+				draw_target = screen_handle
+			else:
+				draw_target = renderer
+			state.queue_sprites(render_queue, interpolation)
+
+		with profiler.measure('text'):
+			status_text.set_lines(state.text)
+			status_text.draw(hud, (0,0))
+			if overlay != None and options.profile:
+				overlay.draw(hud, (0, font.get_linesize()))
+
+		with profiler.measure('draw'):
+			render_queue.submit(draw_target)
+
+		with profiler.measure('flip'):
+			if renderer == None:
+				pygame.display.flip()
+			else:
+				renderer.present()
+		if latency != None:
+			latency.presented(state.input_step, time.perf_counter())
+
+		# Input handled while waiting reaches the simulation on its next step.
+		with profiler.measure('wait'):
+			if pacer != None and wait_for_frame(pacer, input_state, options):
+				simulation.stop()
+				quit_game()
+
+		if profiler.enabled:
+			step_count = simulation.step_count
+			profiler.count('steps', step_count - previous_step_count)
+			previous_step_count = step_count
+			profiler.count('dropped_steps', simulation.dropped_steps)
+			for name, count in state.counts().items():
+				profiler.count(name, count)
+		profiler.end_frame()
+
+	simulation.join()
+
+def get_system_resolution():
+	# windll only exists on Windows, where we also need to opt out of DPI scaling.
+	if hasattr(ctypes, 'windll'):
+		ctypes.windll.user32.SetProcessDPIAware()
+		return ctypes.windll.user32.GetSystemMetrics(0), ctypes.windll.user32.GetSystemMetrics(1)
+	display_info = pygame.display.Info()
+	return display_info.current_w, display_info.current_h
+
+# With a render_resolution, the game draws everything at that size and SDL scales
+# each finished frame up to the display (letterboxed if the shapes differ), so the
+# pixel work no longer grows with the panel.  The arena keeps its own size in game
+# coordinates, the display's unless --arena-size says otherwise, and is scaled
+# down to the render resolution as it is drawn, so the render resolution only
+# changes how sharp the game looks, never how it plays.
+#
+# Returns the screen and the display's own resolution.
+def init(render_resolution=None):
 	pygame.init()
 	pygame.joystick.init()
-	ctypes.windll.user32.SetProcessDPIAware()
-	system_resolution = ctypes.windll.user32.GetSystemMetrics(0), ctypes.windll.user32.GetSystemMetrics(1)
-	screen_handle = pygame.display.set_mode(system_resolution, pygame.FULLSCREEN, display=0)
-	return screen_handle
+	system_resolution = get_system_resolution()
+	if render_resolution == None:
+		screen_handle = pygame.display.set_mode(system_resolution, pygame.FULLSCREEN, display=0)
+	else:
+		screen_handle = pygame.display.set_mode(render_resolution, pygame.FULLSCREEN | pygame.SCALED, display=0)
+	return screen_handle, system_resolution
+
+def parse_options(arguments=None):
+	parser = argparse.ArgumentParser(description='Space War')
+	parser.add_argument('--simulation-rate', type=int, default=60, help='simulation steps per second; lifetimes are counted in steps, so this also sets game speed')
+	parser.add_argument('--render-rate', type=int, default=60, help='most frames drawn per second, 0 for no limit')
+	parser.add_argument('--maximum-catch-up-steps', type=int, default=5, help='most simulation steps run for one frame before the game slows down instead')
+	parser.add_argument('--entity-store', action='store_true', help='run physics through the NumPy entity store')
+	parser.add_argument('--rect-collisions', action='store_true', help='collide bounding rectangles instead of pixels')
+	parser.add_argument('--gravity', choices=dark_gravity.engine_names, default='objects', help='how gravity is worked out: per object, exactly in one NumPy pass, or from a precomputed field')
+	parser.add_argument('--moons', type=bounded_int(0, RECORDING_MOONS_MAXIMUM), default=0, help=f'moons circling the planet, each pulling on everything too, at most {RECORDING_MOONS_MAXIMUM}')
+	parser.add_argument('--integrator', choices=dark_integrator.method_names, default='euler', help='how objects move under gravity and thrust, see dark_integrator')
+	parser.add_argument('--substeps', type=bounded_int(1, RECORDING_SUBSTEPS_MASK), default=1, help=f'most steps an object close to a planet is split into per tick, with --integrator, at most {RECORDING_SUBSTEPS_MASK}')
+	parser.add_argument('--render-resolution', type=int, nargs=2, default=None, metavar=('WIDTH', 'HEIGHT'), help='draw at this size and let the display hardware scale it up, instead of drawing at the full display resolution; the arena keeps its size')
+	parser.add_argument('--arena-size', type=int, nargs=2, default=None, metavar=('WIDTH', 'HEIGHT'), help='size of the playfield in game coordinates, defaults to the display resolution; fix it to play the same arena on every display')
+	parser.add_argument('--threaded', action='store_true', help='simulate on a thread of its own, so drawing and waiting for the display never hold up a step')
+	parser.add_argument('--dirty-rects', action='store_true', help='only redraw and update the parts of the screen that changed')
+	parser.add_argument('--profile', action='store_true', help='time each phase of every frame and show the results on screen (F3 toggles)')
+	parser.add_argument('--profile-trace', default=None, help='also write per-frame timings to this file, as JSON if it ends in .json and CSV otherwise')
+	parser.add_argument('--atlas', default='images.atlas', help='assets baked with space_war_bake.py, used instead of the PNGs when the file exists')
+	parser.add_argument('--input-latency', action='store_true', help='print each player\'s input to present latency histogram at the end of every round')
+	parser.add_argument('--input-latency-output', default=None, help='also write the latency histograms to this JSON file')
+	parser.add_argument('--record', default=None, help='write each round\'s input log to this path, numbered per round; play it back with space_war_replay.py')
+	return parser.parse_args(arguments)
+
+def main():
+	options = parse_options()
+	render_resolution = None
+	if options.render_resolution != None:
+		render_resolution = tuple(options.render_resolution)
+	screen_handle, system_resolution = init(render_resolution)
+	if options.arena_size == None:
+		options.arena_size = system_resolution
+	if os.path.exists(options.atlas):
+		start_time = time.perf_counter()
+		count = install_atlas(options.atlas)
+		print(f"Installed {count} surfaces from {options.atlas} in {(time.perf_counter() - start_time) * 1000:.1f}ms")
+	preload_assets()
+
+	# One profiler for the whole session, so the trace covers every round.
+	profiler = None
+	if options.profile or options.profile_trace != None:
+		profiler = dark_profile.FrameProfiler()
+
+	round_number = 0
+	while True:
+		round_number += 1
+		recording_path = None
+		if options.record != None:
+			root, extension = os.path.splitext(options.record)
+			recording_path = f"{root}-{round_number}{extension}"
+		start_round(screen_handle, options, profiler, recording_path)
 
 #
 # Execution starts here.
 #
-screen_handle = init()
-joysticks = {}
-joystick_instances = []
-
-alliance_score = 0
-federation_score = 0
-
-while True:
-	start_round(screen_handle)
+if __name__ == '__main__':
+	main()
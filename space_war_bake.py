@@ -0,0 +1,32 @@
+import argparse
+import os
+import time
+
+import space_war
+import space_war_headless
+
+#
+# Bakes every asset Space War loads into one atlas file (see dark_atlas and
+# space_war.bake_atlas): the images at the sizes the Arena asks for, the
+# explosion frames, and with --rotations every rotated frame of every fighter
+# and bullet.  space_war.py installs it at startup when it finds it.
+#
+# Rebake whenever an image, a size or the rotation steps change.
+#
+
+def main():
+	parser = argparse.ArgumentParser(description='Bake the Space War images into one atlas file.')
+	parser.add_argument('--output', default='images.atlas')
+	parser.add_argument('--rotations', action='store_true', help='also bake every rotated frame, for a larger file but no rotating at all at run time')
+	args = parser.parse_args()
+
+	# A display, so the images are prepared exactly as the game prepares them.
+	space_war_headless.init_headless((1,1))
+	start_time = time.perf_counter()
+	space_war.preload_assets(args.rotations)
+	count = space_war.bake_atlas(args.output)
+	elapsed = time.perf_counter() - start_time
+	print(f"Baked {count} surfaces into {args.output}, {os.path.getsize(args.output) / 1e6:.1f} MB in {elapsed:.2f}s")
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,359 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import pygame
+
+import dark_entity_store
+import dark_gravity
+import dark_integrator
+import dark_image
+import dark_input_log
+import dark_math
+import dark_profile
+import space_war
+import space_war_headless
+
+#
+# Each benchmark is a setup function that builds its workload and returns a
+# "step" function.  Only the step is timed, so work done to keep the workload
+# steady (topping up bullets, rebuilding state) happens between samples.
+#
+
+def summarize(durations):
+	durations = sorted(durations)
+	mean = sum(durations) / len(durations)
+	return {
+		'samples': len(durations),
+		'ticks_per_sec': 1 / mean if mean > 0 else None,
+		'us_per_frame': {
+			'mean': mean * 1e6,
+			'p50': dark_profile.percentile(durations, 0.50) * 1e6,
+			'p90': dark_profile.percentile(durations, 0.90) * 1e6,
+			'p99': dark_profile.percentile(durations, 0.99) * 1e6,
+			'max': durations[-1] * 1e6,
+		}
+	}
+
+def run_benchmark(setup, samples, warmup):
+	step, replenish = setup()
+	for _ in range(warmup):
+		step()
+		replenish()
+	durations = []
+	for _ in range(samples):
+		start_time = time.perf_counter()
+		step()
+		durations.append(time.perf_counter() - start_time)
+		replenish()
+	return summarize(durations)
+
+def nothing():
+	pass
+
+#
+# Workloads
+#
+
+# An arena whose fighters never die and whose bullets are topped back up to the
+# requested count between samples.  Bullets are spread over the arena and aged
+# so that some of them expire on every tick.
+def make_arena(screen, bullet_count, explosion_count, use_entity_store=False, integrator=None):
+	arena = space_war.Arena(screen, use_entity_store, integrator=integrator)
+	arena.bullet_maximum = max(bullet_count, 1)
+	width, height = screen.get_size()
+
+	def top_up():
+		arena.fighter_alliance.exploded = False
+		arena.fighter_federation.exploded = False
+		arena.tick_countdown = None
+		for bullets, add_bullet in [(arena.alliance_bullets, arena.add_alliance_bullet), (arena.federation_bullets, arena.add_federation_bullet)]:
+			while len(bullets) < bullet_count:
+				index = len(bullets)
+				add_bullet()
+				bullet = bullets[-1]
+				bullet.position = ((index * 97) % width, (index * 61) % height)
+				bullet.lifetime_tick_count = (index * 7) % arena.maximum_bullet_lifetime_ticks
+		# Collisions during the sample add explosions of their own.
+		del arena.explosions[explosion_count:]
+		while len(arena.explosions) < explosion_count:
+			index = len(arena.explosions)
+			explosion = space_war.Explosion(
+				arena.fighter_alliance.fighter_explosion_image,
+				pygame.Rect(((index * 131) % width, (index * 71) % height), (50,50)),
+				arena.fighter_alliance
+			)
+			explosion.lifetime_tick_count = (index * 13) % 180
+			arena.explosions.append(explosion)
+
+	# Keep the fighters well clear of the planet and of each other so the round never ends.
+	def reset_fighters():
+		arena.fighter_alliance.position = (100,100)
+		arena.fighter_alliance.velocity = (0,0)
+		arena.fighter_federation.position = (width - 200, height - 200)
+		arena.fighter_federation.velocity = (0,0)
+
+	def replenish():
+		reset_fighters()
+		top_up()
+
+	replenish()
+	return arena, replenish
+
+def bench_arena_tick(screen, bullets, explosions, use_entity_store, integrator='euler', substeps=1):
+	def setup():
+		arena, replenish = make_arena(screen, bullets, explosions, use_entity_store, dark_integrator.create_integrator(integrator, substeps))
+		return arena.tick, replenish
+	return setup
+
+def bench_arena_draw(screen, bullets, explosions):
+	def setup():
+		arena, replenish = make_arena(screen, bullets, explosions)
+		def step():
+			screen.fill((0,0,0))
+			arena.draw()
+		# Age the explosions so that the draw also walks through their animation.
+		def advance():
+			replenish()
+			for explosion in arena.explosions:
+				explosion.tick()
+		return step, advance
+	return setup
+
+# Arena always has exactly two fighters, so fighter scaling is measured on
+# free-standing fighters under the arena planet's gravity.
+def bench_fighters_tick(screen, fighters):
+	def setup():
+		arena = space_war.Arena(screen)
+		fleet = []
+		for index in range(fighters):
+			fighter = arena.__load_fighter_team__(['alliance', 'federation'][index % 2], (0,0), index * 7 % 360)
+			fleet.append(fighter)
+		def step():
+			arena.gravity.apply(arena.gravity_bodies(), fleet)
+			for fighter in fleet:
+				fighter.rotate_clockwise()
+				fighter.tick()
+		def replenish():
+			for index, fighter in enumerate(fleet):
+				fighter.position = ((index * 97) % 1000, (index * 61) % 700)
+				fighter.velocity = (0,0)
+		replenish()
+		return step, replenish
+	return setup
+
+# Gravity alone, for every bullet and both fighters, with moons around the planet.
+def bench_gravity(screen, gravity, bullets, moons, use_entity_store):
+	def setup():
+		arena, replenish = make_arena(screen, bullets, 0, use_entity_store)
+		arena.gravity = dark_gravity.create_engine(gravity, screen.get_size())
+		arena.add_moons(moons)
+		def step():
+			if arena.entity_store == None:
+				arena.gravity.apply(arena.gravity_bodies(), arena.moveable())
+			else:
+				arena.gravity.apply_to_store(arena.gravity_bodies(), arena.entity_store)
+		return step, replenish
+	return setup
+
+def bench_rotate_image_circular(image):
+	def setup():
+		state = {'angle': 0}
+		def step():
+			dark_image.rotate_image_circular(image, state['angle'])
+		def replenish():
+			state['angle'] = (state['angle'] + 7) % 360
+		return step, replenish
+	return setup
+
+# Baking a whole explosion animation from scratch, as the first explosion of a size does.
+def bench_explosion_frames_bake(explosion_image):
+	def setup():
+		def step():
+			space_war.ExplosionFrames(explosion_image, (50,50))
+		def replenish():
+			pass
+		return step, replenish
+	return setup
+
+# Looking up one frame of a baked animation, as every explosion does every frame.
+def bench_explosion_get_frame(explosion_image):
+	def setup():
+		explosion_frames = space_war.ExplosionFrames(explosion_image, (50,50))
+		state = {'tick': 0}
+		def step():
+			explosion_frames.get_frame(state['tick'])
+		def replenish():
+			state['tick'] = (state['tick'] + 1) % 360
+		return step, replenish
+	return setup
+
+# Real rounds from input logs, one recorded tick per step, starting over when the log runs out.
+# The arena is built at the resolution the log was recorded at, so it plays out the same way.
+def bench_replay(log, use_entity_store):
+	def setup():
+		screen = pygame.Surface(log.resolution)
+		state = {'arena': None, 'tick': len(log)}
+		def step():
+			arena = state['arena']
+			alliance_input, federation_input = log.inputs(state['tick'])
+			arena.apply_controls(space_war.controls_from_byte(alliance_input), space_war.controls_from_byte(federation_input))
+			arena.tick()
+			state['tick'] += 1
+		def replenish():
+			if state['tick'] >= len(log):
+				state['arena'] = space_war.create_recorded_arena(screen, log, use_entity_store)
+				state['tick'] = 0
+		replenish()
+		return step, replenish
+	return setup
+
+# Vector helpers are timed in batches, because a single call is below timer resolution.
+def bench_dark_math(name, calls_per_sample=1000):
+	workloads = {
+		'add2': lambda: dark_math.add2((1.5, 2.5), (3.5, 4.5)),
+		'sub2': lambda: dark_math.sub2((1.5, 2.5), (3.5, 4.5)),
+		'mul2': lambda: dark_math.mul2((1.5, 2.5), 0.15),
+		'div2': lambda: dark_math.div2((1.5, 2.5), 2),
+		'normal2': lambda: dark_math.normal2((3.0, 2.0)),
+		'degrees_to_normal2': lambda: dark_math.degrees_to_normal2(33.0),
+		'normal_to_degrees2': lambda: dark_math.normal_to_degrees2((0.8, 0.6)),
+	}
+	workload = workloads[name]
+	def setup():
+		def step():
+			for _ in range(calls_per_sample):
+				workload()
+		return step, nothing
+	return setup
+
+def build_suite(screen, scales, replays=[]):
+	explosion_image = dark_image.load_image('images/explosion.png')
+	fighter_image = dark_image.load_image('images/fighter_alliance.png', (50,50))
+
+	suite = []
+	for bullets in scales['bullets']:
+		for explosions in scales['explosions']:
+			params = {'bullets_per_team': bullets, 'explosions': explosions}
+			suite.append(('arena_tick', params, bench_arena_tick(screen, bullets, explosions, False)))
+			if dark_entity_store.is_available():
+				suite.append(('arena_tick_entity_store', params, bench_arena_tick(screen, bullets, explosions, True)))
+			suite.append(('arena_draw', params, bench_arena_draw(screen, bullets, explosions)))
+	if dark_integrator.is_available():
+		for bullets in scales['bullets']:
+			for integrator, substeps in [('semi-implicit', 1), ('verlet', 1), ('verlet', 8)]:
+				params = {'bullets_per_team': bullets, 'integrator': integrator, 'substeps': substeps}
+				suite.append(('arena_tick_integrator', params, bench_arena_tick(screen, bullets, 0, False, integrator, substeps)))
+				if dark_entity_store.is_available():
+					suite.append(('arena_tick_integrator_entity_store', params, bench_arena_tick(screen, bullets, 0, True, integrator, substeps)))
+	for bullets in scales['bullets']:
+		for moons in scales['moons']:
+			for gravity in dark_gravity.engine_names:
+				if gravity != 'objects' and not dark_gravity.is_available():
+					continue
+				params = {'bullets_per_team': bullets, 'moons': moons, 'gravity': gravity}
+				suite.append(('gravity', params, bench_gravity(screen, gravity, bullets, moons, False)))
+				if dark_entity_store.is_available():
+					suite.append(('gravity_entity_store', params, bench_gravity(screen, gravity, bullets, moons, True)))
+	for fighters in scales['fighters']:
+		suite.append(('fighters_tick', {'fighters': fighters}, bench_fighters_tick(screen, fighters)))
+	suite.append(('rotate_image_circular', {'size': [50,50]}, bench_rotate_image_circular(fighter_image)))
+	suite.append(('explosion_frames_bake', {'size': [50,50]}, bench_explosion_frames_bake(explosion_image)))
+	suite.append(('explosion_get_frame', {'size': [50,50]}, bench_explosion_get_frame(explosion_image)))
+	for name in ['add2', 'sub2', 'mul2', 'div2', 'normal2', 'degrees_to_normal2', 'normal_to_degrees2']:
+		suite.append(('dark_math.' + name, {'calls_per_sample': 1000}, bench_dark_math(name)))
+	for path in replays:
+		log = dark_input_log.load_input_log(path)
+		params = {'replay': os.path.basename(path), 'ticks': len(log)}
+		suite.append(('replay', params, bench_replay(log, False)))
+		if dark_entity_store.is_available():
+			suite.append(('replay_entity_store', params, bench_replay(log, True)))
+	return suite
+
+def git_revision():
+	try:
+		return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def result_key(result):
+	return result['name'] + json.dumps(result['params'], sort_keys=True)
+
+# Prints the change in mean frame time against an earlier results file and
+# returns the number of benchmarks that regressed past the threshold.
+def compare(results, baseline_path, threshold):
+	with open(baseline_path) as baseline_file:
+		baseline = {result_key(result): result for result in json.load(baseline_file)['results']}
+	regressions = 0
+	for result in results:
+		previous = baseline.get(result_key(result))
+		if previous is None:
+			continue
+		before = previous['us_per_frame']['mean']
+		after = result['us_per_frame']['mean']
+		change = (after - before) / before if before > 0 else 0
+		flag = ''
+		if change > threshold:
+			flag = ' REGRESSION'
+			regressions += 1
+		print(f"{result['name']:<28} {json.dumps(result['params']):<44} {before:10.1f}us -> {after:10.1f}us {change:+7.1%}{flag}")
+	return regressions
+
+def main():
+	parser = argparse.ArgumentParser(description='Benchmark the Space War simulation and rendering hot paths.')
+	parser.add_argument('--samples', type=int, default=300)
+	parser.add_argument('--warmup', type=int, default=30)
+	parser.add_argument('--bullets', type=int, nargs='+', default=[0, 5, 50, 200], help='bullets per team')
+	parser.add_argument('--explosions', type=int, nargs='+', default=[0, 2, 20])
+	parser.add_argument('--fighters', type=int, nargs='+', default=[2, 20, 200])
+	parser.add_argument('--moons', type=int, nargs='+', default=[0, 6], help='moons around the planet, for the gravity benchmarks')
+	parser.add_argument('--filter', default=None, help='only run benchmarks whose name contains this')
+	parser.add_argument('--resolution', type=int, nargs=2, default=(1920,1080))
+	parser.add_argument('--output', default='bench_output.json')
+	parser.add_argument('--compare', default=None, help='earlier results file to compare against')
+	parser.add_argument('--threshold', type=float, default=0.10, help='relative slowdown counted as a regression')
+	parser.add_argument('--replay', nargs='+', default=[], help='input logs to benchmark as real-world workloads')
+	args = parser.parse_args()
+
+	screen = space_war_headless.init_headless(tuple(args.resolution))
+	space_war.preload_assets()
+
+	scales = {'bullets': args.bullets, 'explosions': args.explosions, 'fighters': args.fighters, 'moons': args.moons}
+	results = []
+	for name, params, setup in build_suite(screen, scales, args.replay):
+		if args.filter != None and not args.filter in name:
+			continue
+		# Images loaded on a cache miss print; keep that out of the results.
+		with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+			summary = run_benchmark(setup, args.samples, args.warmup)
+		result = {'name': name, 'params': params}
+		result.update(summary)
+		results.append(result)
+		frame = summary['us_per_frame']
+		print(f"{name:<28} {json.dumps(params):<44} {frame['mean']:10.1f}us mean {frame['p99']:10.1f}us p99 {summary['ticks_per_sec']:12.0f}/s")
+
+	report = {
+		'revision': git_revision(),
+		'timestamp': time.time(),
+		'python': platform.python_version(),
+		'pygame': pygame.version.ver,
+		'platform': platform.platform(),
+		'resolution': list(args.resolution),
+		'samples': args.samples,
+		'results': results,
+	}
+	with open(args.output, 'w') as output_file:
+		json.dump(report, output_file, indent=1)
+	print(f"Wrote {len(results)} results to {args.output}")
+
+	if args.compare != None:
+		if compare(results, args.compare, args.threshold) > 0:
+			sys.exit(1)
+
+if __name__ == '__main__':
+	main()
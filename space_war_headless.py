@@ -0,0 +1,227 @@
+import argparse
+import os
+import random
+import time
+
+import pygame
+
+import dark_gravity
+import dark_integrator
+import space_war
+from dark_math import *
+from space_war import Controls
+
+#
+# Pilots decide the controls for one fighter, one tick at a time.
+#
+class IdlePilot:
+	def controls(self, arena, fighter, enemy):
+		return Controls()
+
+# With a seed, it starts at a random point of its firing cycle, so seeded rounds differ.
+class SpinningPilot:
+	def __init__(self, fire_interval_ticks=20, seed=None):
+		self.fire_interval_ticks = fire_interval_ticks
+		self.tick_count = 0
+		if seed != None:
+			self.tick_count = random.Random(seed).randrange(fire_interval_ticks)
+
+	def controls(self, arena, fighter, enemy):
+		self.tick_count += 1
+		return Controls(+1, True, self.tick_count % self.fire_interval_ticks == 0)
+
+class RandomPilot:
+	def __init__(self, seed=None):
+		self.random = random.Random(seed)
+
+	def controls(self, arena, fighter, enemy):
+		return Controls(
+			self.random.choice([-1, 0, +1]),
+			self.random.random() < 0.3,
+			self.random.random() < 0.05
+		)
+
+# Plays back a fixed list of Controls, then idles.
+class ScriptedPilot:
+	def __init__(self, script):
+		self.script = script
+		self.tick_count = 0
+
+	def controls(self, arena, fighter, enemy):
+		if self.tick_count >= len(self.script):
+			return Controls()
+		controls = self.script[self.tick_count]
+		self.tick_count += 1
+		return controls
+
+# Turns to lead the enemy and fires once lined up and in range, unless it is
+# falling into the planet, in which case it turns away and burns clear first.
+# With a seed, how far it leads the enemy and how early it runs from the planet
+# vary at random by up to a third, so seeded rounds fly differently.
+class AimingPilot:
+	def __init__(self, aim_tolerance_degrees=5, fire_interval_ticks=8, danger_ticks=150, seed=None):
+		self.aim_tolerance_degrees = aim_tolerance_degrees
+		self.fire_interval_ticks = fire_interval_ticks
+		# How soon an impact has to be coming to start running from it.
+		self.danger_ticks = danger_ticks
+		self.ticks_since_fired = fire_interval_ticks
+		self.lead = 1
+		if seed != None:
+			seeded_random = random.Random(seed)
+			self.lead = seeded_random.uniform(2 / 3, 4 / 3)
+			self.danger_ticks *= seeded_random.uniform(2 / 3, 4 / 3)
+
+	def controls(self, arena, fighter, enemy):
+		self.ticks_since_fired += 1
+
+		# Where the enemy will be, relative to us, by the time a bullet fired now gets there.
+		offset = sub2(enemy.position, fighter.position)
+		flight_ticks = len2(offset) / fighter.bullet_speed
+		in_range = flight_ticks < arena.maximum_bullet_lifetime_ticks
+		flight_ticks = min(flight_ticks, arena.maximum_bullet_lifetime_ticks)
+		heading = add2(offset, mul2(sub2(enemy.velocity, fighter.velocity), flight_ticks * self.lead))
+
+		# Closing on the planet's surface fast enough to hit it soon?
+		planet_offset = sub2(arena.planet.get_rect().center, fighter.get_rect().center)
+		planet_distance = len2(planet_offset)
+		falling = False
+		if planet_distance > 0:
+			closing_speed = sum(mul2(fighter.velocity, normal2(planet_offset)))
+			surface_distance = planet_distance - (arena.planet.image.get_width() + fighter.image.get_width()) / 2
+			falling = closing_speed > 0 and surface_distance < closing_speed * self.danger_ticks
+		if falling:
+			heading = mul2(planet_offset, -1)
+
+		if are_equal2(heading, (0,0)):
+			return Controls()
+
+		# Positive means the heading is anticlockwise of where we point.
+		difference = (normal_to_degrees2(normal2(heading)) - fighter.direction + 180) % 360 - 180
+		rotate = 0
+		if difference > fighter.rotation_speed / 2:
+			rotate = -1
+		elif difference < -fighter.rotation_speed / 2:
+			rotate = +1
+
+		# Any burn with a component away from the planet helps, so don't wait to be lined up.
+		thrusters = falling and abs(difference) < 90
+		fire = not falling and in_range and abs(difference) <= self.aim_tolerance_degrees and self.ticks_since_fired >= self.fire_interval_ticks
+		if fire:
+			self.ticks_since_fired = 0
+		return Controls(rotate, thrusters, fire)
+
+pilots = {
+	'idle': lambda seed: IdlePilot(),
+	'spin': lambda seed: SpinningPilot(seed=seed),
+	'random': lambda seed: RandomPilot(seed),
+	'aim': lambda seed: AimingPilot(seed=seed),
+}
+
+# Pilots that play the same whatever their seed, so a pairing of two of them
+# only needs playing once.
+deterministic_pilots = ['idle']
+
+#
+# SDL's dummy driver gives us a real display surface without a window, so the
+# normal asset path (convert_alpha and friends) still works.  With display=False
+# the arena draws into a plain Surface and SDL's video subsystem is never started.
+#
+def init_headless(resolution=(1920,1080), display=True):
+	if display:
+		os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+		pygame.display.init()
+		return pygame.display.set_mode(resolution)
+	return pygame.Surface(resolution)
+
+# Runs one round as fast as the CPU allows.  Returns the arena and the number of ticks run.
+# The round stops as soon as it is decided, unless play_out is set, when it also
+# runs the countdown after it the way the game does.
+# parameters, if given, are passed to Arena.apply_parameters before the first tick.
+# Input logs have no room for them, so they can't be combined with recording_path.
+# gravity is a dark_gravity engine name, and moons are added around the planet.
+# integrator is a dark_integrator method name, with up to substeps steps per tick.
+def run_round(screen, alliance_pilot, federation_pilot, tick_budget=None, draw=False, use_entity_store=False, recording_path=None, parameters=None, gravity='objects', moons=0, integrator='euler', substeps=1, play_out=False):
+	if recording_path != None and parameters != None:
+		raise ValueError("Input logs don't record Arena parameters, so a round with parameters can't be replayed")
+	arena = space_war.Arena(
+		screen,
+		use_entity_store,
+		gravity=dark_gravity.create_engine(gravity, screen.get_size()),
+		integrator=dark_integrator.create_integrator(integrator, substeps)
+	)
+	arena.add_moons(moons)
+	if parameters != None:
+		arena.apply_parameters(parameters)
+	tick_count = 0
+
+	recorder = None
+	if recording_path != None:
+		recorder = space_war.start_recording(recording_path, arena, 60)
+
+	while arena.is_alive() and (play_out or arena.outcome == None) and (tick_budget == None or tick_count < tick_budget):
+		alliance_controls = alliance_pilot.controls(arena, arena.fighter_alliance, arena.fighter_federation)
+		federation_controls = federation_pilot.controls(arena, arena.fighter_federation, arena.fighter_alliance)
+		if recorder != None:
+			recorder.record(space_war.controls_to_byte(alliance_controls), space_war.controls_to_byte(federation_controls))
+		arena.apply_controls(alliance_controls, federation_controls)
+		arena.tick()
+		if draw:
+			screen.fill((0,0,0))
+			arena.draw()
+		tick_count += 1
+
+	if recorder != None:
+		recorder.close(arena.state_digest())
+	return arena, tick_count
+
+def main():
+	parser = argparse.ArgumentParser(description='Run Space War rounds without a window, as fast as possible.')
+	parser.add_argument('--rounds', type=int, default=1)
+	parser.add_argument('--ticks', type=int, default=None, help='tick budget per round')
+	parser.add_argument('--alliance', choices=pilots.keys(), default='random')
+	parser.add_argument('--federation', choices=pilots.keys(), default='random')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--draw', action='store_true', help='also draw every tick')
+	parser.add_argument('--play-out', action='store_true', help='run the countdown after each round is decided too, as the game does')
+	parser.add_argument('--no-display', action='store_true', help='do not start any SDL video driver')
+	parser.add_argument('--resolution', type=int, nargs=2, default=(1920,1080))
+	parser.add_argument('--entity-store', action='store_true', help='run physics through the NumPy entity store')
+	parser.add_argument('--record', default=None, help='write each round\'s input log to this path, numbered per round')
+	parser.add_argument('--gravity', choices=dark_gravity.engine_names, default='objects', help='how gravity is worked out, see dark_gravity')
+	parser.add_argument('--moons', type=space_war.bounded_int(0, space_war.RECORDING_MOONS_MAXIMUM), default=0, help=f'moons circling the planet, at most {space_war.RECORDING_MOONS_MAXIMUM}')
+	parser.add_argument('--integrator', choices=dark_integrator.method_names, default='euler', help='how objects move under gravity and thrust, see dark_integrator')
+	parser.add_argument('--substeps', type=space_war.bounded_int(1, space_war.RECORDING_SUBSTEPS_MASK), default=1, help=f'most steps per tick near a planet, with --integrator, at most {space_war.RECORDING_SUBSTEPS_MASK}')
+	args = parser.parse_args()
+
+	screen = init_headless(tuple(args.resolution), not args.no_display)
+	space_war.preload_assets()
+
+	total_ticks = 0
+	start_time = time.perf_counter()
+	for round_index in range(args.rounds):
+		recording_path = None
+		if args.record != None:
+			root, extension = os.path.splitext(args.record)
+			recording_path = f"{root}-{round_index + 1}{extension}"
+		arena, tick_count = run_round(
+			screen,
+			pilots[args.alliance](args.seed + round_index * 2),
+			pilots[args.federation](args.seed + round_index * 2 + 1),
+			args.ticks,
+			args.draw,
+			args.entity_store,
+			recording_path,
+			gravity=args.gravity,
+			moons=args.moons,
+			integrator=args.integrator,
+			substeps=args.substeps,
+			play_out=args.play_out
+		)
+		total_ticks += tick_count
+		print(f"Round {round_index + 1}: {arena.outcome} after {tick_count} ticks")
+	elapsed = time.perf_counter() - start_time
+
+	print(f"{total_ticks} ticks in {elapsed:.3f}s, {total_ticks / elapsed:.0f} ticks/sec")
+
+if __name__ == '__main__':
+	main()
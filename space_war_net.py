@@ -0,0 +1,418 @@
+import argparse
+import struct
+import time
+import zlib
+
+import pygame
+
+import dark_gravity
+import dark_integrator
+import dark_input_log
+import dark_net
+import dark_text
+import dark_timing
+import space_war
+import space_war_headless
+from space_war import controls_from_axes, controls_to_byte, controls_from_byte
+
+#
+# Two-player network play with rollback.
+#
+# Each side runs its own Arena and never waits for the other to simulate a tick.
+# Local input is scheduled input_delay ticks ahead and sent to the peer; where
+# the peer's input for a tick hasn't arrived yet it is predicted (the last known
+# stick and thrusters, without the button press).  When the real input turns
+# out to differ from the prediction, the arena is restored from the snapshot
+# taken before that tick and the ticks since are simulated again, all within
+# one frame.  A side only stalls once it is maximum_prediction ticks ahead of
+# the last input it has from the peer.
+#
+# Every packet repeats all of the sender's inputs the peer hasn't acknowledged
+# yet, so a lost packet costs nothing but a little latency.  Every
+# CHECK_INTERVAL_TICKS confirmed ticks, the two sides also compare a checksum
+# of their snapshots, to catch a desync as soon as it happens.  The entity
+# store keeps bullets in the same pools and plays out bit-identically, so each
+# side can choose --entity-store for itself.
+#
+
+PACKET_MAGIC = b'SWNP'
+
+# magic, round, settings checksum, ack (the sender has every input below this tick),
+# checked tick (-1 for none), snapshot checksum, first tick, input count
+__packet_header__ = struct.Struct('<4sHIIiIIB')
+
+MAXIMUM_INPUTS_PER_PACKET = 255
+CHECK_INTERVAL_TICKS = 60
+
+# Both sides have to build exactly the same arena, or nothing will line up.
+def settings_checksum(arena, tick_limit=None):
+	width, height = arena.size
+	gravity = dark_gravity.engine_names.index(arena.gravity.name)
+	integrator, substeps = 0, 1
+	if arena.integrator != None:
+		integrator = dark_integrator.method_names.index(arena.integrator.method)
+		substeps = arena.integrator.maximum_substeps
+	return zlib.crc32(struct.pack('<HH?IBHBH', width, height, arena.pixel_collisions, tick_limit or 0, gravity, len(arena.planets), integrator, substeps))
+
+# Held sticks and thrusters tend to stay held, but a button press is a one-off.
+def predict_input(previous_input):
+	rotate, thrusters, fire = dark_input_log.unpack_input(previous_input)
+	return dark_input_log.pack_input(rotate, thrusters, False)
+
+class RollbackSession:
+	def __init__(self, arena, local_player, link, round_number=0, input_delay=2, maximum_prediction=8, tick_limit=None, clock=time.perf_counter):
+		self.arena = arena
+		# 0 flies the alliance fighter, 1 the federation fighter.
+		self.local_player = local_player
+		self.link = link
+		self.round_number = round_number
+		self.input_delay = input_delay
+		self.maximum_prediction = maximum_prediction
+		# Ends the round after this many ticks even if nobody has crashed, the same on both sides.
+		self.tick_limit = tick_limit
+		self.settings = settings_checksum(arena, tick_limit)
+		self.clock = clock
+
+		# The next tick to simulate.
+		self.tick = 0
+		# By tick.  The first input_delay ticks have no input from anyone.
+		self.local_inputs = [0] * input_delay
+		self.remote_inputs = {}
+		# Every remote input below this tick has arrived.
+		self.remote_confirmed = 0
+		# The peer has every local input below this tick.
+		self.remote_ack = 0
+		# Remote inputs that were guessed, by tick, until the real ones arrive.
+		self.predicted = {}
+		# The arena as it was before each tick that may still be rolled back.
+		self.snapshots = {}
+		self.rollback_tick = None
+
+		self.next_check_tick = 0
+		self.local_checks = {}
+		self.remote_checks = {}
+		self.last_local_check = (-1, 0)
+
+		self.last_receive_time = None
+		self.peer_moved_on = False
+		self.settings_mismatch = False
+		self.desynced = False
+
+		self.rollbacks = 0
+		self.resimulated_ticks = 0
+		self.stalled_steps = 0
+
+	def __is_running__(self):
+		return self.arena.is_alive() and (self.tick_limit == None or self.tick < self.tick_limit)
+
+	def __players__(self, local_input, remote_input):
+		if self.local_player == 0:
+			return local_input, remote_input
+		return remote_input, local_input
+
+	def __remote_input__(self, tick):
+		remote_input = self.remote_inputs.get(tick)
+		if remote_input != None:
+			self.predicted.pop(tick, None)
+			return remote_input
+		remote_input = predict_input(self.remote_inputs.get(self.remote_confirmed - 1, 0))
+		self.predicted[tick] = remote_input
+		return remote_input
+
+	def __simulate__(self):
+		tick = self.tick
+		self.snapshots[tick] = self.arena.snapshot()
+		alliance_input, federation_input = self.__players__(self.local_inputs[tick], self.__remote_input__(tick))
+		self.arena.apply_controls(controls_from_byte(alliance_input), controls_from_byte(federation_input))
+		self.arena.tick()
+		self.tick += 1
+
+	def __roll_back__(self):
+		tick = self.rollback_tick
+		self.rollback_tick = None
+		if tick >= self.tick:
+			return
+		self.rollbacks += 1
+
+		end_tick = self.tick
+		self.arena.restore(self.snapshots[tick])
+		self.tick = tick
+		while self.tick < end_tick and self.__is_running__():
+			self.__simulate__()
+			self.resimulated_ticks += 1
+
+		# The round may now end sooner than it did.
+		for stale_tick in range(self.tick, end_tick):
+			self.predicted.pop(stale_tick, None)
+			self.snapshots.pop(stale_tick, None)
+
+	def __compare_checks__(self):
+		for tick in [tick for tick in self.remote_checks if tick in self.local_checks]:
+			if self.remote_checks.pop(tick) != self.local_checks.pop(tick):
+				if not self.desynced:
+					print(f"Desync: the arenas differ at tick {tick}.")
+				self.desynced = True
+
+	# Checksums snapshots once no input that went into them can change any more.
+	def __check__(self):
+		while self.next_check_tick <= self.remote_confirmed and self.next_check_tick < self.tick and self.rollback_tick == None:
+			checksum = zlib.crc32(self.snapshots[self.next_check_tick])
+			self.local_checks[self.next_check_tick] = checksum
+			self.last_local_check = (self.next_check_tick, checksum)
+			self.next_check_tick += CHECK_INTERVAL_TICKS
+		self.__compare_checks__()
+
+	def __prune__(self):
+		oldest_needed = min(self.remote_confirmed, self.next_check_tick)
+		if self.rollback_tick != None:
+			oldest_needed = min(oldest_needed, self.rollback_tick)
+		for tick in [tick for tick in self.snapshots if tick < oldest_needed]:
+			del self.snapshots[tick]
+		# Remote inputs can arrive before their ticks are simulated; keep those, and the last one to predict from.
+		oldest_input_needed = min(self.remote_confirmed, self.tick) - 1
+		for tick in [tick for tick in self.remote_inputs if tick < oldest_input_needed]:
+			del self.remote_inputs[tick]
+
+	def __receive__(self, datagram):
+		if len(datagram) < __packet_header__.size:
+			return
+		magic, round_number, settings, ack, check_tick, check_value, first_tick, count = __packet_header__.unpack_from(datagram)
+		if magic != PACKET_MAGIC:
+			return
+		if settings != self.settings:
+			if not self.settings_mismatch:
+				print("The peer's game is set up differently (resolution, collisions, tick limit, gravity, moons or integrator), ignoring it.")
+			self.settings_mismatch = True
+			return
+		if round_number != self.round_number:
+			# The peer only starts the next round once it has everything it needs from this one.
+			if round_number > self.round_number:
+				self.peer_moved_on = True
+			return
+
+		self.last_receive_time = self.clock()
+		self.remote_ack = max(self.remote_ack, ack)
+		if check_tick >= 0:
+			self.remote_checks[check_tick] = check_value
+
+		inputs = datagram[__packet_header__.size:__packet_header__.size + count]
+		for offset, remote_input in enumerate(inputs):
+			tick = first_tick + offset
+			if tick < self.remote_confirmed or tick in self.remote_inputs:
+				continue
+			self.remote_inputs[tick] = remote_input
+			predicted = self.predicted.pop(tick, None)
+			if predicted != None and predicted != remote_input:
+				if self.rollback_tick == None or tick < self.rollback_tick:
+					self.rollback_tick = tick
+		while self.remote_confirmed in self.remote_inputs:
+			self.remote_confirmed += 1
+
+	# Takes in whatever the peer has sent.
+	def poll(self):
+		for datagram in self.link.receive():
+			self.__receive__(datagram)
+
+	# Runs one tick with this side's controls, unless too far ahead of the peer.
+	# Returns whether a tick was run.
+	def advance(self, local_controls):
+		if self.rollback_tick != None:
+			self.__roll_back__()
+
+		ticked = False
+		if self.__is_running__():
+			if self.tick - self.remote_confirmed >= self.maximum_prediction:
+				self.stalled_steps += 1
+			else:
+				# After a rollback ends the round sooner, inputs already sent for later ticks stand.
+				if len(self.local_inputs) == self.tick + self.input_delay:
+					self.local_inputs.append(controls_to_byte(local_controls))
+				self.__simulate__()
+				ticked = True
+
+		self.__check__()
+		self.__prune__()
+		return ticked
+
+	# Sends every input the peer hasn't acknowledged, with our acknowledgement of theirs.
+	def send(self):
+		first_tick = min(self.remote_ack, len(self.local_inputs))
+		inputs = bytes(self.local_inputs[first_tick:first_tick + MAXIMUM_INPUTS_PER_PACKET])
+		check_tick, check_value = self.last_local_check
+		self.link.send(__packet_header__.pack(
+			PACKET_MAGIC, self.round_number, self.settings, self.remote_confirmed,
+			check_tick, check_value, first_tick, len(inputs)
+		) + inputs)
+
+	# Keeps answering the peer for a while after the last round, since it may still be
+	# waiting to hear that its final inputs arrived.  Any later round starting does that instead.
+	def linger(self, seconds):
+		end_time = self.clock() + seconds
+		while self.clock() < end_time and not self.peer_moved_on:
+			self.poll()
+			self.send()
+			time.sleep(1 / 60)
+
+	def is_connected(self):
+		return self.last_receive_time != None
+
+	def seconds_since_heard(self):
+		if self.last_receive_time == None:
+			return 0
+		return self.clock() - self.last_receive_time
+
+	# The round is over once it has ended on inputs that can no longer change,
+	# and the peer has all of ours.
+	def is_finished(self):
+		if self.rollback_tick != None or self.__is_running__():
+			return False
+		if self.remote_confirmed < self.tick:
+			return False
+		return self.remote_ack >= self.tick or self.peer_moved_on
+
+#
+# The game loop for one round, headless or in a window.
+#
+def play_round(screen, link, options, round_number, pilot=None, draw=False):
+	gravity = dark_gravity.create_engine(options.gravity, screen.get_size())
+	integrator = dark_integrator.create_integrator(options.integrator, options.substeps)
+	arena = space_war.Arena(screen, options.entity_store, pixel_collisions=not options.rect_collisions, gravity=gravity, integrator=integrator)
+	arena.add_moons(options.moons)
+	session = RollbackSession(arena, options.player, link, round_number, options.input_delay, options.maximum_prediction, options.ticks)
+	timestep = dark_timing.FixedTimestep(options.simulation_rate, options.maximum_catch_up_steps)
+
+	status_text = None
+	if draw:
+		status_text = dark_text.TextLayer(dark_text.load_font('arial', 32), separator='; ')
+
+	local_fighter, remote_fighter = arena.fighter_alliance, arena.fighter_federation
+	if options.player == 1:
+		local_fighter, remote_fighter = remote_fighter, local_fighter
+	axis_rotate = 0
+	axis_thruster = 0
+	fire = False
+
+	next_frame_time = time.perf_counter()
+	while not session.is_finished():
+		if draw:
+			for event in pygame.event.get():
+				if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+					return session, 'quit'
+				if event.type == pygame.JOYDEVICEADDED:
+					pygame.joystick.Joystick(event.device_index)
+				if event.type == pygame.JOYAXISMOTION:
+					if event.axis == 0:
+						axis_rotate = event.value
+					if event.axis == 5:
+						axis_thruster = event.value
+				if event.type == pygame.JOYBUTTONDOWN and event.button == 0:
+					fire = True
+
+		session.poll()
+		for step in range(timestep.advance()):
+			if pilot != None:
+				controls = pilot.controls(arena, local_fighter, remote_fighter)
+			else:
+				controls = controls_from_axes(axis_rotate, axis_thruster, fire)
+			if session.advance(controls):
+				fire = False
+		session.send()
+
+		if session.is_connected() and session.seconds_since_heard() > options.disconnect_timeout:
+			return session, 'disconnected'
+
+		if draw:
+			screen.fill((0,0,0))
+			arena.draw(timestep.interpolation())
+			if not session.is_connected():
+				status_text.set_lines(['Waiting for the other player...'])
+			else:
+				status_text.set_lines(arena.text)
+			status_text.draw(screen, (0,0))
+			pygame.display.flip()
+
+		next_frame_time += 1 / options.render_rate
+		delay = next_frame_time - time.perf_counter()
+		if delay > 0:
+			time.sleep(delay)
+		else:
+			next_frame_time = time.perf_counter()
+
+	return session, 'finished'
+
+def parse_address(text):
+	host, port = text.rsplit(':', 1)
+	return host, int(port)
+
+def main():
+	parser = argparse.ArgumentParser(description='Play Space War over UDP, with rollback.')
+	parser.add_argument('--player', type=int, choices=[0, 1], required=True, help='0 flies for the alliance, 1 for the federation')
+	parser.add_argument('--local', type=parse_address, required=True, help='host:port to listen on')
+	parser.add_argument('--remote', type=parse_address, required=True, help='host:port of the other player')
+	parser.add_argument('--rounds', type=int, default=None, help='stop after this many rounds')
+	parser.add_argument('--ticks', type=int, default=None, help='end each round after this many ticks; both players must agree')
+	parser.add_argument('--pilot', choices=space_war_headless.pilots.keys(), default=None, help='let a pilot fly instead of the first joystick')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--headless', action='store_true', help='no window; needs --pilot')
+	parser.add_argument('--resolution', type=int, nargs=2, default=(1920,1080), help='must match the other player')
+	parser.add_argument('--simulation-rate', type=int, default=60)
+	parser.add_argument('--render-rate', type=int, default=60)
+	parser.add_argument('--maximum-catch-up-steps', type=int, default=5)
+	parser.add_argument('--input-delay', type=int, default=2, help='ticks local input is held back, trading latency for fewer rollbacks')
+	parser.add_argument('--maximum-prediction', type=int, default=8, help='most ticks to run ahead of the other player before waiting')
+	parser.add_argument('--disconnect-timeout', type=float, default=5, help='seconds of silence before giving up on the other player')
+	parser.add_argument('--entity-store', action='store_true', help='run physics through the NumPy entity store')
+	parser.add_argument('--rect-collisions', action='store_true', help='collide bounding rectangles instead of pixels; both players must agree')
+	parser.add_argument('--gravity', choices=dark_gravity.engine_names, default='objects', help='how gravity is worked out, see dark_gravity; both players must agree')
+	parser.add_argument('--moons', type=space_war.bounded_int(0, space_war.RECORDING_MOONS_MAXIMUM), default=0, help=f'moons circling the planet, at most {space_war.RECORDING_MOONS_MAXIMUM}; both players must agree')
+	parser.add_argument('--integrator', choices=dark_integrator.method_names, default='euler', help='how objects move under gravity and thrust, see dark_integrator; both players must agree')
+	parser.add_argument('--substeps', type=space_war.bounded_int(1, space_war.RECORDING_SUBSTEPS_MASK), default=1, help=f'most steps per tick near a planet, with --integrator, at most {space_war.RECORDING_SUBSTEPS_MASK}; both players must agree')
+	parser.add_argument('--loss', type=float, default=0, help='simulate a lossy link: fraction of packets dropped')
+	parser.add_argument('--delay', type=float, default=0, help='simulate a slow link: milliseconds added to every packet')
+	parser.add_argument('--jitter', type=float, default=0, help='simulate a jittery link: up to this many more milliseconds, reordering packets')
+	options = parser.parse_args()
+
+	if options.headless and options.pilot == None:
+		parser.error('--headless needs a --pilot')
+
+	if options.headless:
+		screen = space_war_headless.init_headless(tuple(options.resolution))
+	else:
+		pygame.init()
+		pygame.joystick.init()
+		screen = pygame.display.set_mode(tuple(options.resolution), pygame.SCALED)
+	space_war.preload_assets()
+
+	link = dark_net.UdpEndpoint(options.local, options.remote)
+	if options.loss > 0 or options.delay > 0 or options.jitter > 0:
+		link = dark_net.SimulatedLink(link, options.loss, options.delay / 1000, options.jitter / 1000, options.seed)
+
+	round_number = 0
+	session = None
+	while options.rounds == None or round_number < options.rounds:
+		pilot = None
+		if options.pilot != None:
+			pilot = space_war_headless.pilots[options.pilot](options.seed * 1000 + round_number)
+
+		start_time = time.perf_counter()
+		session, result = play_round(screen, link, options, round_number, pilot, not options.headless)
+		elapsed = time.perf_counter() - start_time
+
+		arena = session.arena
+		print(
+			f"Round {round_number + 1}: {result}, {arena.outcome} after {session.tick} ticks in {elapsed:.1f}s, "
+			f"{session.rollbacks} rollbacks, {session.resimulated_ticks} ticks simulated again, "
+			f"{session.stalled_steps} steps stalled, digest {arena.state_digest().hex()[:16]}"
+			+ (", DESYNCED" if session.desynced else "")
+		)
+		if result != 'finished':
+			break
+		round_number += 1
+
+	# Nothing to linger for if no round was played.
+	if session != None:
+		session.linger(1)
+	link.close()
+
+if __name__ == '__main__':
+	main()
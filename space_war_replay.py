@@ -0,0 +1,97 @@
+import argparse
+import sys
+import time
+
+import pygame
+
+import dark_input_log
+import dark_text
+import space_war
+import space_war_headless
+from space_war import controls_from_byte
+
+#
+# Plays back the input logs written by space_war.py --record (or
+# space_war_headless.py --record) through a fresh Arena, one recorded tick per
+# Arena.tick(), and checks the final state against the digest in the log.
+#
+# Without --draw the replay runs headless as fast as the CPU allows.  With it,
+# --speed ticks are run for every frame drawn, to fast-forward through a round.
+#
+
+# Replays a whole log.  Returns the arena and the number of ticks run.
+def replay_round(screen, log, use_entity_store=False, draw=False, ticks_per_frame=1, render_rate=0):
+	arena = space_war.create_recorded_arena(screen, log, use_entity_store)
+
+	status_text = None
+	clock = None
+	if draw:
+		status_text = dark_text.TextLayer(dark_text.load_font('arial', 32), separator='; ')
+		clock = pygame.time.Clock()
+
+	tick_count = 0
+	while tick_count < len(log):
+		alliance_input, federation_input = log.inputs(tick_count)
+		arena.apply_controls(controls_from_byte(alliance_input), controls_from_byte(federation_input))
+		arena.tick()
+		tick_count += 1
+
+		if draw and (tick_count % ticks_per_frame == 0 or tick_count == len(log)):
+			for event in pygame.event.get():
+				if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+					return arena, tick_count
+			screen.fill((0,0,0))
+			arena.draw()
+			status_text.set_lines(arena.text)
+			status_text.draw(screen, (0,0))
+			pygame.display.flip()
+			if render_rate > 0:
+				clock.tick(render_rate)
+
+	return arena, tick_count
+
+def main():
+	parser = argparse.ArgumentParser(description='Replay Space War input logs.')
+	parser.add_argument('logs', nargs='+', help='input logs written with --record')
+	parser.add_argument('--draw', action='store_true', help='show the replay in a window')
+	parser.add_argument('--speed', type=int, default=1, help='ticks run per frame drawn, to fast-forward')
+	parser.add_argument('--render-rate', type=int, default=None, help='most frames drawn per second, 0 for no limit; defaults to the recorded tick rate')
+	parser.add_argument('--entity-store', action='store_true', help='run physics through the NumPy entity store')
+	args = parser.parse_args()
+
+	diverged = 0
+	for path in args.logs:
+		log = dark_input_log.load_input_log(path)
+
+		if args.draw:
+			pygame.init()
+			# The arena has to be the recorded size, whatever the size of the display.
+			screen = pygame.display.set_mode(log.resolution, pygame.SCALED)
+		else:
+			screen = space_war_headless.init_headless(log.resolution)
+		space_war.preload_assets()
+
+		render_rate = args.render_rate
+		if render_rate == None:
+			render_rate = log.ticks_per_second
+
+		start_time = time.perf_counter()
+		arena, tick_count = replay_round(screen, log, args.entity_store, args.draw, max(1, args.speed), render_rate)
+		elapsed = time.perf_counter() - start_time
+
+		if tick_count < len(log):
+			result = 'stopped early'
+		elif log.digest == b'':
+			result = 'no digest recorded'
+		elif arena.state_digest() == log.digest:
+			result = 'bit-identical'
+		else:
+			result = 'DIVERGED'
+			diverged += 1
+		print(f"{path}: {arena.outcome} after {tick_count} ticks in {elapsed:.3f}s, {result}")
+
+	if diverged > 0:
+		sys.exit(1)
+
+if __name__ == '__main__':
+	main()
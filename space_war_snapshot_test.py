@@ -0,0 +1,65 @@
+import contextlib
+import io
+
+import space_war
+import space_war_headless
+import dark_entity_store
+
+#
+# Arena.snapshot() and Arena.restore() round trip: a round is snapshotted part
+# way through, played on, then restored and played on again with the same
+# inputs, which has to end in exactly the same state.  Runs headless, with
+# python space_war_snapshot_test.py or under pytest.
+#
+
+def play(arena, inputs):
+	for alliance_controls, federation_controls in inputs:
+		arena.apply_controls(alliance_controls, federation_controls)
+		arena.tick()
+
+def random_inputs(seed, tick_count):
+	alliance_pilot = space_war_headless.RandomPilot(seed)
+	federation_pilot = space_war_headless.RandomPilot(seed + 1)
+	return [(alliance_pilot.controls(None, None, None), federation_pilot.controls(None, None, None)) for tick in range(tick_count)]
+
+def check_round_trip(use_entity_store, seed):
+	screen = space_war_headless.init_headless((1920,1080), False)
+	with contextlib.redirect_stdout(io.StringIO()):
+		space_war.preload_assets()
+		arena = space_war.Arena(screen, use_entity_store)
+		# Plenty of bullets in flight, so the snapshot has more than the fighters in it.
+		arena.bullet_maximum = 20
+		play(arena, random_inputs(seed, 120))
+
+		snapshot = arena.snapshot()
+		later_inputs = random_inputs(seed + 2, 240)
+		play(arena, later_inputs)
+		expected_digest = arena.state_digest()
+
+		arena.restore(snapshot)
+		play(arena, later_inputs)
+		assert arena.state_digest() == expected_digest, f"restored arena diverged (entity store {use_entity_store}, seed {seed})"
+
+		# A fresh arena restored from the snapshot has to play on the same way too.
+		fresh_arena = space_war.Arena(screen, use_entity_store)
+		fresh_arena.bullet_maximum = 20
+		fresh_arena.restore(snapshot)
+		play(fresh_arena, later_inputs)
+		assert fresh_arena.state_digest() == expected_digest, f"fresh arena diverged (entity store {use_entity_store}, seed {seed})"
+
+# Test 1: snapshot and restore with the objects' own physics
+def test_round_trip():
+	for seed in [0, 10, 20]:
+		check_round_trip(False, seed)
+
+# Test 2: the same through the NumPy entity store
+def test_round_trip_entity_store():
+	if not dark_entity_store.is_available():
+		return
+	for seed in [0, 10, 20]:
+		check_round_trip(True, seed)
+
+if __name__ == '__main__':
+	test_round_trip()
+	test_round_trip_entity_store()
+	print("Snapshot round trips are bit-identical.")
@@ -0,0 +1,151 @@
+import argparse
+import concurrent.futures
+import contextlib
+import itertools
+import json
+import os
+import time
+
+import space_war
+import space_war_headless
+
+#
+# Self-play tournaments for balancing.
+#
+# Every combination of the given parameter values is played by every ordered
+# pair of pilots, for a number of seeded rounds each (just the one for two
+# deterministic pilots), spread over all cores with
+# a process pool.  Each worker sets up a headless screen and loads the assets
+# once, then plays whatever matches it is handed.
+#
+# A match stops as soon as the round is decided, and its ticks are the tick it
+# was decided on.
+#
+# Results are appended to a JSON Lines file as each match finishes, in whatever
+# order they finish, one match per line with its id, so a long run can be
+# watched (or cut short) without losing anything, and a
+# summary of win rates and round lengths per parameter set and pairing is
+# printed (and optionally written as JSON) at the end.
+#
+
+__worker_screen__ = None
+
+def init_worker(resolution):
+	global __worker_screen__
+	__worker_screen__ = space_war_headless.init_headless(resolution, False)
+	with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+		space_war.preload_assets()
+
+def play_match(match):
+	pilots = space_war_headless.pilots
+	start_time = time.perf_counter()
+	arena, tick_count = space_war_headless.run_round(
+		__worker_screen__,
+		pilots[match['alliance']](match['seed'] * 2),
+		pilots[match['federation']](match['seed'] * 2 + 1),
+		match['tick_budget'],
+		parameters=match['parameters']
+	)
+	result = dict(match)
+	result['outcome'] = arena.outcome
+	result['ticks'] = tick_count
+	result['seconds'] = time.perf_counter() - start_time
+	return result
+
+# "thruster_power=0.1,0.15,0.2" becomes ('thruster_power', [0.1, 0.15, 0.2]).
+def parse_parameter(text):
+	name, values = text.split('=', 1)
+	return name, [float(value) for value in values.split(',')]
+
+def build_matches(parameter_ranges, pilot_names, rounds, tick_budget):
+	names = [name for name, values in parameter_ranges]
+	parameter_sets = [dict(zip(names, values)) for values in itertools.product(*[values for name, values in parameter_ranges])]
+	matches = []
+	for parameters in parameter_sets:
+		for alliance, federation in itertools.product(pilot_names, pilot_names):
+			# Seeds change nothing between deterministic pilots.
+			pairing_rounds = rounds
+			if alliance in space_war_headless.deterministic_pilots and federation in space_war_headless.deterministic_pilots:
+				pairing_rounds = 1
+			for seed in range(pairing_rounds):
+				matches.append({
+					'id': len(matches),
+					'parameters': parameters,
+					'alliance': alliance,
+					'federation': federation,
+					'seed': seed,
+					'tick_budget': tick_budget,
+				})
+	return matches
+
+def summary_key(result):
+	return json.dumps(result['parameters'], sort_keys=True), result['alliance'], result['federation']
+
+def summarize(results):
+	groups = {}
+	for result in results:
+		groups.setdefault(summary_key(result), []).append(result)
+
+	summary = []
+	for (parameters, alliance, federation), group in groups.items():
+		ticks = sorted(result['ticks'] for result in group)
+		outcomes = [result['outcome'] for result in group]
+		summary.append({
+			'parameters': json.loads(parameters),
+			'alliance': alliance,
+			'federation': federation,
+			'rounds': len(group),
+			'alliance_win_rate': outcomes.count('alliance') / len(group),
+			'federation_win_rate': outcomes.count('federation') / len(group),
+			'draw_rate': outcomes.count('draw') / len(group),
+			'unfinished_rate': outcomes.count(None) / len(group),
+			'mean_ticks': sum(ticks) / len(ticks),
+			'median_ticks': ticks[len(ticks) // 2],
+		})
+	return summary
+
+def main():
+	parser = argparse.ArgumentParser(description='Play many headless Space War rounds in parallel, for balancing.')
+	parser.add_argument('--parameter', type=parse_parameter, action='append', default=[], metavar='NAME=V1,V2,...', help='values to try for an Arena.apply_parameters parameter, may be repeated')
+	parser.add_argument('--pilots', nargs='+', choices=space_war_headless.pilots.keys(), default=['aim', 'random'])
+	parser.add_argument('--rounds', type=int, default=10, help='seeded rounds per parameter set and pairing')
+	parser.add_argument('--ticks', type=int, default=3600, help='tick budget per round, after which it counts as unfinished')
+	parser.add_argument('--workers', type=int, default=None, help='worker processes, defaults to one per core')
+	parser.add_argument('--resolution', type=int, nargs=2, default=(1920,1080))
+	parser.add_argument('--output', default='tournament_results.jsonl')
+	parser.add_argument('--summary', default=None, help='also write the summary to this JSON file')
+	args = parser.parse_args()
+
+	matches = build_matches(args.parameter, args.pilots, args.rounds, args.ticks)
+	print(f"Playing {len(matches)} matches.")
+
+	results = []
+	start_time = time.perf_counter()
+	with open(args.output, 'w') as output_file, concurrent.futures.ProcessPoolExecutor(args.workers, initializer=init_worker, initargs=(tuple(args.resolution),)) as executor:
+		futures = [executor.submit(play_match, match) for match in matches]
+		for future in concurrent.futures.as_completed(futures):
+			result = future.result()
+			output_file.write(json.dumps(result) + '\n')
+			output_file.flush()
+			results.append(result)
+	elapsed = time.perf_counter() - start_time
+	# Summarized in match order, however they finished.
+	results.sort(key=lambda result: result['id'])
+
+	total_ticks = sum(result['ticks'] for result in results)
+	print(f"{len(results)} matches, {total_ticks} ticks in {elapsed:.1f}s, {len(results) / elapsed:.1f} matches/sec, {total_ticks / elapsed:.0f} ticks/sec")
+
+	summary = summarize(results)
+	for row in summary:
+		print(
+			f"{json.dumps(row['parameters']):<50} {row['alliance']:>8} vs {row['federation']:<8} "
+			f"alliance {row['alliance_win_rate']:5.1%} federation {row['federation_win_rate']:5.1%} "
+			f"draw {row['draw_rate']:5.1%} unfinished {row['unfinished_rate']:5.1%} "
+			f"ticks {row['mean_ticks']:7.1f} mean {row['median_ticks']:5d} median"
+		)
+	if args.summary != None:
+		with open(args.summary, 'w') as summary_file:
+			json.dump(summary, summary_file, indent=1)
+
+if __name__ == '__main__':
+	main()